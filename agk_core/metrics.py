@@ -1,23 +1,40 @@
 from decimal import Decimal, InvalidOperation
 from django.shortcuts import get_object_or_404
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils.formats import number_format
-from apps.orders.models import Order, OrderBatch
+from apps.orders.models import BatchLogisticsSummary, Order, OrderBatch
+from apps.orders import logistics
 from apps.inventory.models import ItemPackagingVersion
 from apps.shipments.models import Shipment
 
 
+MONEY = DecimalField(max_digits=20, decimal_places=2)
+
+
 def get_order_metrics(order_pk):
     # 1) Busca a Order, lança 404 se não existir
     order = get_object_or_404(Order, pk=order_pk)
-    # 2) Busca os itens da order; ajuste o related_name se for diferente
-    items = order.order_items.select_related('item').all()
 
-    # 3) Calcula totais
-    total_cost_price = sum(item.cost_price   * item.quantity for item in items)
-    total_selling_price = sum(item.total for item in items)
-    total_quantity = sum(item.quantity for item in items)
+    # 2) Totais calculados no banco, em uma única query e sem instanciar os itens
+    totals = order.order_items.aggregate(
+        total_cost_price=Coalesce(
+            Sum(F('cost_price') * F('quantity'), output_field=MONEY),
+            Value(Decimal('0')), output_field=MONEY,
+        ),
+        total_selling_price=Coalesce(
+            Sum(F('sale_price') * F('quantity'), output_field=MONEY),
+            Value(Decimal('0')), output_field=MONEY,
+        ),
+        total_quantity=Coalesce(Sum('quantity'), 0),
+    )
+
+    # 3) Calcula totais derivados
+    total_cost_price = totals['total_cost_price']
+    total_selling_price = totals['total_selling_price']
+    total_quantity = totals['total_quantity']
     total_profit = total_selling_price - total_cost_price
-    deposit_payment = total_selling_price * order.down_payment * Decimal(0.01)
+    deposit_payment = total_selling_price * order.down_payment / Decimal('100')
     # 4) Formata valores numéricos com duas casas decimais e agrupamento de milhar
     formatted_cost = number_format(total_cost_price, decimal_pos=2, force_grouping=True)
     formatted_selling = number_format(total_selling_price, decimal_pos=2, force_grouping=True)
@@ -39,7 +56,7 @@ def get_batch_metrics(order_batch_pk):
         batch.batch_items
              .select_related(
                  'order_item__packaging_version',
-                 'order_item__item'
+                 'order_item__item__current_packaging_version'
              )
              .all()
     )
@@ -48,10 +65,6 @@ def get_batch_metrics(order_batch_pk):
     total_cost_price = ZERO
     total_selling_price = ZERO
     total_quantity = ZERO
-    total_box_qty = ZERO
-    total_gw = ZERO
-    total_nw = ZERO
-    total_cbm = ZERO
     packaging_info = []
 
     for bi in items:
@@ -71,19 +84,15 @@ def get_batch_metrics(order_batch_pk):
                 **{ fld: getattr(pv, fld) for fld in ItemPackagingVersion.PACKAGING_FIELDS }
             })
 
-            qpm = Decimal(pv.qty_per_master_box or 0)
-            if qpm:
-                masters = qty / qpm
-                total_box_qty += masters
-                total_gw += masters * pv.package_gross_weight                
-                total_nw += masters * pv.net_weight
-                total_cbm += masters * (pv.packing_lengh * pv.packing_width * pv.packing_height)
+    # 2) Logística: lida do resumo materializado do lote
+    logistics.ensure_summaries(OrderBatch.objects.filter(pk=batch.pk))
+    summary = BatchLogisticsSummary.objects.get(batch=batch)
 
-    # 4) Lucro e sinal
+    # 3) Lucro e sinal
     total_profit = total_selling_price - total_cost_price
     deposit_payment = total_selling_price * batch.order.down_payment / Decimal('100')
 
-    # 5) Formatação amigável
+    # 4) Formatação amigável
     fmt = lambda v: number_format(v, decimal_pos=2, force_grouping=True)
 
     return {
@@ -92,58 +101,31 @@ def get_batch_metrics(order_batch_pk):
         'total_quantity': total_quantity,
         'total_profit': fmt(total_profit),
         'deposit_payment': fmt(deposit_payment),
-        'total_box_qty': fmt(total_box_qty),
-        'total_nw': fmt(total_nw),
-        'total_gw': fmt(total_gw),
-        'total_cbm': fmt(total_cbm),
+        'total_box_qty': fmt(summary.box_qty),
+        'total_nw': fmt(summary.net_weight),
+        'total_gw': fmt(summary.gross_weight),
+        'total_cbm': fmt(summary.cbm),
         'packaging_info': packaging_info,
     }
 
 
 def get_shipment_metrics(shipment_pk):
     shipment = get_object_or_404(Shipment, pk=shipment_pk)
-    shipment_batches = shipment.shipment_batches.select_related('order_batch').all()
 
-    ZERO = Decimal('0')
-    total_box_qty = ZERO
-    total_nw = ZERO
-    total_gw = ZERO
-    total_cbm = ZERO
-
-    for sb in shipment_batches:
-        order_batch = sb.order_batch
-        items = (
-            order_batch.batch_items
-                .select_related(
-                    'order_item__packaging_version',
-                    'order_item__item'
-                )
-                .all()
-        )
-
-        for bi in items:
-            oi = bi.order_item
-            qty = Decimal(bi.quantity)
-
-            pv = oi.packaging_version or oi.item.current_packaging_version
-            if not pv:
-                continue
-
-            qpm = Decimal(pv.qty_per_master_box or 0)
-            if qpm:
-                masters = qty / qpm
-                total_box_qty += masters
-                total_gw += masters * pv.package_gross_weight
-                total_nw += masters * pv.net_weight
-                total_cbm += masters * (
-                    pv.packing_lengh * pv.packing_width * pv.packing_height
-                )
+    # soma das linhas pré-calculadas de cada lote do shipment
+    logistics.ensure_summaries(shipment.batches.all())
+    totals = BatchLogisticsSummary.objects.filter(
+        batch__in_shipments__shipment=shipment
+    ).aggregate(**{
+        f: Coalesce(Sum(f), Value(Decimal('0')), output_field=MONEY)
+        for f in logistics.SUMMARY_FIELDS
+    })
 
     fmt = lambda v: number_format(v, decimal_pos=2, force_grouping=True)
 
     return {
-        'total_box_qty': fmt(total_box_qty),
-        'total_nw': fmt(total_nw),
-        'total_gw': fmt(total_gw),
-        'total_cbm': fmt(total_cbm),
+        'total_box_qty': fmt(totals['box_qty']),
+        'total_nw': fmt(totals['net_weight']),
+        'total_gw': fmt(totals['gross_weight']),
+        'total_cbm': fmt(totals['cbm']),
     }
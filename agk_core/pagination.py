@@ -0,0 +1,205 @@
+"""
+Paginação por keyset (seek).
+
+Em vez de OFFSET + COUNT, cada página é buscada a partir da chave da última
+(ou primeira) linha da página vizinha: WHERE (k1, k2) > (v1, v2) ORDER BY
+k1, k2 LIMIT n. Com um índice nas chaves, a página 200 custa o mesmo que a
+primeira. As chaves precisam identificar a linha de forma única (terminar
+em pk) e podem ser descendentes ('-created_at').
+
+A posição vai na URL como um cursor opaco (?cursor=...): a direção e os
+valores das chaves da linha de referência, em JSON base64.
+
+Listas usam CursorPaginationMixin (ListView) e {% render_pagination %}.
+"""
+import base64
+import binascii
+import datetime
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+
+CURSOR_PARAM = 'cursor'
+AFTER, BEFORE = 'a', 'b'
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # o DjangoJSONEncoder corta datetimes em milissegundos; o cursor
+    # precisa do valor exato para a comparação com a linha de referência
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(direction, values):
+    raw = json.dumps([direction, list(values)], cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """(direção, valores) do cursor, ou None se vazio ou inválido."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if direction not in (AFTER, BEFORE) or not isinstance(values, list) or len(values) != size:
+        return None
+    return direction, values
+
+
+class KeysetPage:
+    """
+    Página de um KeysetPaginator; sem número nem total de páginas
+    (estimated_count, quando pedido, é só uma ordem de grandeza).
+    """
+    is_keyset = True
+    estimated_count = None
+
+    def __init__(self, object_list, paginator, cursor, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.cursor = cursor
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __repr__(self):
+        return f'<KeysetPage {self.cursor or "first"}>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_cursor(AFTER, self.paginator.key_values(self.object_list[-1]))
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_cursor(BEFORE, self.paginator.key_values(self.object_list[0]))
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, per_page, keys=('pk',)):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.keys = tuple(keys)
+
+    def key_values(self, obj):
+        return [getattr(obj, key.lstrip('-')) for key in self.keys]
+
+    def get_page(self, cursor=None):
+        """
+        Página seguinte ao cursor (ou anterior, se o cursor for de volta);
+        cursor vazio ou inválido devolve a primeira página. Uma linha a
+        mais é buscada só para saber se há página além desta.
+        """
+        decoded = decode_cursor(cursor, len(self.keys))
+        if decoded is None:
+            rows = list(self.queryset.order_by(*self.keys)[:self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], self, None, len(rows) > self.per_page, False)
+
+        direction, values = decoded
+        if direction == AFTER:
+            rows = list(
+                self.queryset
+                    .filter(self._seek(self.keys, values))
+                    .order_by(*self.keys)[:self.per_page + 1]
+            )
+            return KeysetPage(rows[:self.per_page], self, cursor, len(rows) > self.per_page, True)
+
+        reverse = tuple(_reverse(key) for key in self.keys)
+        rows = list(
+            self.queryset
+                .filter(self._seek(reverse, values))
+                .order_by(*reverse)[:self.per_page + 1]
+        )
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        if not has_previous:
+            # voltou até o início: é a primeira página, sem cursor
+            return self.get_page(None)
+        return KeysetPage(rows, self, cursor, True, True)
+
+    @staticmethod
+    def _seek(keys, values):
+        """
+        Linhas depois de `values` na ordem `keys`:
+        k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...; com mais de uma chave,
+        k1 >= v1 em volta para o banco usar o índice como faixa.
+        """
+        condition = Q()
+        equal = Q()
+        for key, value in zip(keys, values):
+            field = key.lstrip('-')
+            op = 'lt' if key.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field}__{op}': value})
+            equal &= Q(**{field: value})
+        if len(keys) == 1:
+            return condition
+        first = keys[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & condition
+
+
+def _reverse(key):
+    return key[1:] if key.startswith('-') else f'-{key}'
+
+
+def estimated_count(queryset):
+    """
+    Número aproximado de linhas do queryset. No PostgreSQL vem da
+    estimativa do planner (EXPLAIN, sem executar a consulta), que leva em
+    conta os filtros aplicados; nos demais bancos, COUNT(*) exato.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CursorPaginationMixin:
+    """
+    ListView paginada por keyset em vez de OFFSET + COUNT: as páginas
+    seguem ?cursor= na ordem de `cursor_keys` (por padrão as mais recentes
+    primeiro), a um custo constante. Com `estimate_count`, a página traz
+    também o total estimado (estimated_count).
+
+    O template usa {% render_pagination page_obj %}; page_obj não tem
+    número nem paginator.num_pages.
+    """
+    cursor_keys = ('-created_at', '-pk')
+    estimate_count = False
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.cursor_keys)
+        page = paginator.get_page(self.request.GET.get(CURSOR_PARAM))
+        if self.estimate_count:
+            page.estimated_count = estimated_count(queryset)
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,130 @@
+"""
+Busca textual indexada (autocomplete e filtros de listas).
+
+As buscas comparam sempre lower(coluna) com o termo já em minúsculas, para
+usar os índices criados por CreateSearchIndex:
+ - PostgreSQL: GIN com pg_trgm sobre lower(coluna), que atende tanto
+   prefixo (LIKE 'abc%') quanto substring (LIKE '%abc%');
+ - demais bancos (SQLite em dev): índice funcional lower(coluna).
+
+Use starts_with / contains em vez de __istartswith / __icontains: no
+PostgreSQL essas geram UPPER(coluna::text), que não casa com o índice.
+"""
+from django.db.migrations.operations.base import Operation
+from django.http import JsonResponse
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.db.models.lookups import Contains, StartsWith
+
+
+AUTOCOMPLETE_LIMIT = 20
+AUTOCOMPLETE_MIN_LENGTH = 2
+
+
+def normalize(term):
+    return (term or '').strip().lower()
+
+
+def starts_with(field, term):
+    """lower(field) LIKE 'term%'."""
+    return Q(StartsWith(Lower(field), normalize(term)))
+
+
+def contains(field, term):
+    """lower(field) LIKE '%term%'."""
+    return Q(Contains(Lower(field), normalize(term)))
+
+
+def contains_any(fields, term):
+    """contains() em qualquer um dos campos (OR)."""
+    condition = Q()
+    for field in fields:
+        condition |= contains(field, term)
+    return condition
+
+
+class IndexedSearchAdminMixin:
+    """
+    Busca do admin pelos índices de busca: cada palavra do termo precisa
+    estar contida (lower LIKE) em algum dos `indexed_search_fields`. Troca
+    o __icontains padrão do admin, que não usa esses índices.
+    """
+    indexed_search_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not self.indexed_search_fields:
+            return super().get_search_results(request, queryset, search_term)
+        for word in search_term.split():
+            queryset = queryset.filter(contains_any(self.indexed_search_fields, word))
+        return queryset, False
+
+
+def autocomplete_response(request, search, label=str):
+    """
+    Resposta JSON dos endpoints de autocomplete: {"results": [{id, text}]}
+    com no máximo AUTOCOMPLETE_LIMIT opções. `search(term)` recebe o termo
+    (?q=) já normalizado e devolve o queryset ordenado; termos curtos demais
+    não consultam o banco.
+    """
+    term = normalize(request.GET.get('q'))
+    if len(term) < AUTOCOMPLETE_MIN_LENGTH:
+        return JsonResponse({'results': []})
+    return JsonResponse({'results': [
+        {'id': obj.pk, 'text': label(obj)}
+        for obj in search(term)[:AUTOCOMPLETE_LIMIT]
+    ]})
+
+
+class CreateSearchIndex(Operation):
+    """
+    Cria o índice de busca de uma coluna de texto (ver docstring do módulo).
+    Não altera o estado dos models: o índice depende do banco e por isso
+    não é declarado em Meta.indexes.
+    """
+    reversible = True
+
+    def __init__(self, model_name, field_name, name):
+        self.model_name = model_name
+        self.field_name = field_name
+        self.name = name
+
+    def deconstruct(self):
+        return (
+            self.__class__.__qualname__,
+            [],
+            {'model_name': self.model_name, 'field_name': self.field_name, 'name': self.name},
+        )
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        quote = schema_editor.quote_name
+        table = quote(model._meta.db_table)
+        column = quote(model._meta.get_field(self.field_name).column)
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {quote(self.name)} '
+                f'ON {table} USING gin (lower({column}) gin_trgm_ops)'
+            )
+        else:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {quote(self.name)} ON {table} (lower({column}))'
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(self.name)}')
+
+    def describe(self):
+        return f'Create search index {self.name} on {self.model_name}.{self.field_name}'
+
+    @property
+    def migration_name_fragment(self):
+        return self.name.lower()
@@ -127,6 +127,20 @@ else:
     }
 
 
+# Cache
+# O app e os workers (process_import_jobs, process_proforma_pdfs) são
+# processos separados em qualquer ambiente: o cache precisa ser compartilhado
+# para que a invalidação (ex.: mapa de margens) valha para todos. A tabela é
+# criada com manage.py createcachetable (já no CMD do Dockerfile).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
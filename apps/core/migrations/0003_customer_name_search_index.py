@@ -0,0 +1,15 @@
+# Generated by Django 5.2.3 on 2026-10-17 17:20
+
+from django.db import migrations
+from agk_core.search import CreateSearchIndex
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_businessunit_ordertype_port_project_and_more'),
+    ]
+
+    operations = [
+        CreateSearchIndex('customer', 'name', name='core_customer_name_search'),
+    ]
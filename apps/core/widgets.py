@@ -0,0 +1,41 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    <select> que renderiza só a opção selecionada; as demais são buscadas
+    sob demanda em um endpoint JSON de autocomplete (static/js/autocomplete.js).
+
+    O endpoint vai em data-autocomplete-url: fixo (url=) ou definido pelo
+    form/formset quando depende do objeto (ex.: itens de uma order).
+    O queryset do campo continua valendo para a validação.
+    """
+
+    def __init__(self, url=None, attrs=None):
+        attrs = {'class': 'form-select form-select-sm', **(attrs or {})}
+        if url is not None:
+            attrs['data-autocomplete-url'] = url
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        # com o iterador padrão do ModelChoiceField, não percorre a tabela
+        # inteira: carrega só os valores selecionados
+        if isinstance(self.choices, ModelChoiceIterator):
+            self.choices = self._selected_choices(self.choices, value)
+        return super().optgroups(name, value, attrs)
+
+    @staticmethod
+    def _selected_choices(iterator, value):
+        choices = []
+        if iterator.field.empty_label is not None:
+            choices.append(('', iterator.field.empty_label))
+        selected = [v for v in value if v not in (None, '')]
+        if selected:
+            try:
+                objects = list(iterator.queryset.filter(pk__in=selected))
+            except (ValueError, TypeError, ValidationError):
+                objects = []
+            choices += [iterator.choice(obj) for obj in objects]
+        return choices
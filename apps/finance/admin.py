@@ -6,18 +6,19 @@ from .models import ProformaInvoice
 class ProformaInvoiceAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'order', 'created_at',
-        'usd_rmb', 'payment_terms', 'deposit_percentage', 'pdf_link'
+        'usd_rmb', 'payment_terms', 'deposit_percentage', 'pdf_status', 'pdf_link'
     )
-    list_filter = ('created_at', 'payment_terms')
+    list_filter = ('created_at', 'payment_terms', 'pdf_status')
     search_fields = ('order__pk', 'order__customer__name')
 
     readonly_fields = (
-        'created_at', 'pdf', 'pdf_link'
+        'created_at', 'pdf', 'pdf_link', 'pdf_status', 'pdf_error'
     )
     fields = (
         'order', 'usd_rmb', 'payment_terms', 'deposit_percentage',
-        'created_at', 'pdf_link', 'pdf'
+        'created_at', 'pdf_status', 'pdf_error', 'pdf_link', 'pdf'
     )
+    actions = ['regenerate_pdf']
 
     def pdf_link(self, obj):
         if obj.pdf:
@@ -34,5 +35,10 @@ class ProformaInvoiceAdmin(admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
-        # garante que o PDF seja (re)gerado sempre ao salvar
-        obj.generate_pdf()
\ No newline at end of file
+        # o worker (re)gera o PDF; sem mudanças no conteúdo, reaproveita o arquivo
+        obj.request_pdf()
+
+    @admin.action(description='Regenerar PDF')
+    def regenerate_pdf(self, request, queryset):
+        count = queryset.update(pdf_status=ProformaInvoice.PDF_PENDING, pdf_error='')
+        self.message_user(request, f'{count} PDF(s) enviado(s) para a fila.')
\ No newline at end of file
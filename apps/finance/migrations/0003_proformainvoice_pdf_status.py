@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-17 16:18
+
+from django.db import migrations, models
+
+
+def mark_existing_pdfs_ready(apps, schema_editor):
+    # PIs antigas já têm o PDF gerado no request; sem hash, a próxima
+    # regeração renderiza de novo e passa a usar o cache
+    ProformaInvoice = apps.get_model('finance', 'ProformaInvoice')
+    ProformaInvoice.objects.exclude(pdf='').exclude(pdf__isnull=True).update(pdf_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_alter_proformainvoice_pdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proformainvoice',
+            name='pdf_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='proformainvoice',
+            name='pdf_hash',
+            field=models.CharField(blank=True, help_text='Hash do conteúdo usado no último PDF gerado', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='proformainvoice',
+            name='pdf_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.RunPython(mark_existing_pdfs_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_proformainvoice_pdf_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proformainvoice',
+            name='pdf_claimed_at',
+            field=models.DateTimeField(blank=True, help_text='Quando um worker reivindicou a geração do PDF', null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-17 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_proformainvoice_pdf_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='proformainvoice',
+            index=models.Index(fields=['created_at', 'id'], name='finance_pi_created_pk_idx'),
+        ),
+    ]
@@ -1,5 +1,8 @@
+import hashlib
+import json
 from django.db import models
 from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
 from io import BytesIO
 from django.template.loader import render_to_string
 from xhtml2pdf import pisa
@@ -32,6 +35,26 @@ def proforma_invoice_upload_path(instance, filename):
     return os.path.join('proforma_invoices', f'order_{order_pk}', name)
 
 class ProformaInvoice(models.Model):
+    """
+    O PDF é gerado fora do request: a PI nasce com pdf_status pendente e o
+    worker (manage.py process_proforma_pdfs) renderiza. pdf_hash guarda o
+    hash do conteúdo do último PDF, então regerar uma PI sem mudanças
+    reaproveita o arquivo em vez de rodar o xhtml2pdf de novo.
+    """
+    PDF_PENDING = 'pending'
+    PDF_RUNNING = 'running'
+    PDF_READY = 'ready'
+    PDF_FAILED = 'failed'
+    PDF_STATUS_CHOICES = [
+        (PDF_PENDING, 'Pending'),
+        (PDF_RUNNING, 'Running'),
+        (PDF_READY, 'Ready'),
+        (PDF_FAILED, 'Failed'),
+    ]
+    PDF_TEMPLATE = 'finance/proforma_invoice_pdf.html'
+    # incremente ao mudar o layout do PDF para invalidar os arquivos já gerados
+    PDF_LAYOUT_VERSION = 1
+
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='proforma')
     created_at = models.DateTimeField(auto_now_add=True)
     usd_rmb = models.DecimalField(max_digits=10, decimal_places=4)
@@ -42,35 +65,128 @@ class ProformaInvoice(models.Model):
         blank=True, null=True,
         help_text="Arquivo PDF gerado da Proforma Invoice"
     )
+    pdf_status = models.CharField(max_length=10, choices=PDF_STATUS_CHOICES, default=PDF_PENDING)
+    pdf_hash = models.CharField(
+        max_length=64, blank=True,
+        help_text="Hash do conteúdo usado no último PDF gerado"
+    )
+    pdf_error = models.TextField(blank=True)
+    pdf_claimed_at = models.DateTimeField(
+        null=True, blank=True,
+        help_text="Quando um worker reivindicou a geração do PDF"
+    )
+
+    class Meta:
+        indexes = [
+            # lista de PIs paginada por keyset (mais recentes primeiro)
+            models.Index(fields=['created_at', 'id'], name='finance_pi_created_pk_idx'),
+        ]
 
     def __str__(self):
         return f"PI #{self.pk} para Order #{self.order.pk}"
 
-    def generate_pdf(self):
-        # 1) Renderiza o HTML
-        html = render_to_string('finance/proforma_invoice_pdf.html', {
-            'pi': self,
-            'items': [
-                {
-                    'code': it.item.s_code,
-                    'name': it.item.name,
-                    'sale_price': it.sale_price,
-                    'quantity': it.quantity,
-                    'total': it.total,
-                }
-                for it in self.order.order_items.select_related('item').all()
-            ],
-            'total_sum': sum(it.total for it in self.order.order_items.all()),
-        })
-        # 2) Gera PDF em memória
-        result = BytesIO()
-        status = pisa.CreatePDF(html, dest=result)
-        if status.err:
-            raise RuntimeError(f"Erro ao gerar PDF: {status.err}")
-
-        # 3) Salva o arquivo no FileField e no banco
-        filename = f'proforma_invoice_{self.order.pk}_{self.pk}.pdf'
-        self.pdf.save(filename, ContentFile(result.getvalue()), save=True)
+    @property
+    def pdf_in_progress(self):
+        return self.pdf_status in (self.PDF_PENDING, self.PDF_RUNNING)
+
+    def pdf_items(self):
+        return [
+            {
+                'code': it.item.s_code,
+                'name': it.item.name,
+                'sale_price': it.sale_price,
+                'quantity': it.quantity,
+                'total': it.total,
+            }
+            for it in self.order.order_items.select_related('item').order_by('pk')
+        ]
+
+    def content_hash(self, items=None):
+        """sha256 de tudo que o template do PDF mostra (campos da PI, da order e linhas)."""
+        if items is None:
+            items = self.pdf_items()
+        order = self.order
+        payload = [
+            self.PDF_LAYOUT_VERSION,
+            self.pk, self.usd_rmb, self.payment_terms, self.deposit_percentage,
+            order.pk, str(order.customer), str(order.pol), str(order.pod),
+            [[it['code'], it['name'], it['sale_price'], it['quantity']] for it in items],
+        ]
+        return hashlib.sha256(json.dumps(payload, cls=DjangoJSONEncoder).encode()).hexdigest()
+
+    def request_pdf(self):
+        """
+        Coloca a PI na fila do worker. Se ela estiver sendo gerada, a
+        reivindicação atual é descartada: o worker não grava o resultado
+        (ver finish_pdf) e a PI é renderizada de novo.
+        """
+        self.pdf_status = self.PDF_PENDING
+        self.pdf_error = ''
+        self.pdf_claimed_at = None
+        type(self).objects.filter(pk=self.pk).update(
+            pdf_status=self.pdf_status, pdf_error='', pdf_claimed_at=None,
+        )
+
+    def finish_pdf(self, **fields):
+        """
+        Grava o resultado do worker só se a PI ainda estiver reivindicada por
+        ele (mesmo pdf_claimed_at). Retorna False se ela foi pedida de novo ou
+        reivindicada por outro worker; nesse caso a linha fica como está.
+        """
+        return bool(
+            type(self).objects
+                .filter(pk=self.pk, pdf_status=self.PDF_RUNNING, pdf_claimed_at=self.pdf_claimed_at)
+                .update(**fields)
+        )
+
+    def generate_pdf(self, force=False):
+        """
+        Renderiza e salva o PDF da reivindicação atual (pdf_claimed_at). Se
+        o conteúdo não mudou desde o último PDF (mesmo pdf_hash e arquivo
+        ainda no storage), só marca como pronto.
+        Retorna True se renderizou.
+        """
+        items = self.pdf_items()
+        content_hash = self.content_hash(items)
+        cached = (
+            not force
+            and content_hash == self.pdf_hash
+            and self.pdf
+            and self.pdf.storage.exists(self.pdf.name)
+        )
+        if not cached:
+            # 1) Renderiza o HTML
+            html = render_to_string(self.PDF_TEMPLATE, {
+                'pi': self,
+                'items': items,
+                'total_sum': sum(it['total'] for it in items),
+            })
+            # 2) Gera PDF em memória
+            result = BytesIO()
+            status = pisa.CreatePDF(html, dest=result)
+            if status.err:
+                raise RuntimeError(f"Erro ao gerar PDF: {status.err}")
+
+            # 3) Grava o arquivo novo; o antigo só sai depois que a linha
+            #    passar a apontar para o novo
+            old_name = self.pdf.name if self.pdf else None
+            filename = f'proforma_invoice_{self.order.pk}_{self.pk}.pdf'
+            self.pdf.save(filename, ContentFile(result.getvalue()), save=False)
+            self.pdf_hash = content_hash
+
+        self.pdf_status = self.PDF_READY
+        self.pdf_error = ''
+        finished = self.finish_pdf(
+            pdf=self.pdf.name, pdf_hash=self.pdf_hash,
+            pdf_status=self.pdf_status, pdf_error='',
+        )
+        if not cached:
+            storage = self.pdf.storage
+            if not finished:
+                storage.delete(self.pdf.name)
+            elif old_name and old_name != self.pdf.name:
+                storage.delete(old_name)
+        return not cached
 
     def delete(self, *args, **kwargs):
         # apaga o arquivo físico
@@ -0,0 +1,69 @@
+"""
+Fila de geração dos PDFs das Proforma Invoices, no mesmo esquema de
+apps.orders.jobs: a PI pendente é "reivindicada" com um UPDATE condicional
+(pendente → em execução), então vários workers podem rodar em paralelo.
+
+Uma PI em execução reivindicada há mais de STALE_AFTER é tratada como
+abandonada (worker morto, container reiniciado) e volta para a fila. O
+resultado só é gravado se a reivindicação do worker ainda for a vigente
+(ProformaInvoice.finish_pdf).
+"""
+from datetime import timedelta
+from django.db.models import Q
+from django.utils import timezone
+from .models import ProformaInvoice
+
+
+STALE_AFTER = timedelta(minutes=10)
+
+
+def claimable_pdfs():
+    """PIs pendentes ou em execução reivindicadas há mais de STALE_AFTER."""
+    stale = Q(pdf_claimed_at__lt=timezone.now() - STALE_AFTER) | Q(pdf_claimed_at__isnull=True)
+    return ProformaInvoice.objects.filter(
+        Q(pdf_status=ProformaInvoice.PDF_PENDING)
+        | Q(stale, pdf_status=ProformaInvoice.PDF_RUNNING)
+    )
+
+
+def claim_next_pdf():
+    """Reserva a PI disponível mais antiga; retorna None se a fila estiver vazia."""
+    while True:
+        pending = claimable_pdfs()
+        pk = pending.order_by('pk').values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+        claimed = pending.filter(pk=pk).update(
+            pdf_status=ProformaInvoice.PDF_RUNNING,
+            pdf_claimed_at=timezone.now(),
+        )
+        if claimed:
+            return (
+                ProformaInvoice.objects
+                    .select_related('order__customer', 'order__pol', 'order__pod')
+                    .get(pk=pk)
+            )
+        # outro worker pegou esta PI antes; tenta a próxima
+
+
+def run_pdf(pi):
+    """Gera o PDF (ou reaproveita o atual, se o conteúdo não mudou)."""
+    try:
+        pi.generate_pdf()
+    except Exception as e:
+        pi.pdf_status = ProformaInvoice.PDF_FAILED
+        pi.pdf_error = str(e)
+        pi.finish_pdf(pdf_status=pi.pdf_status, pdf_error=pi.pdf_error)
+    return pi
+
+
+def run_pending(limit=None):
+    """Esvazia a fila (ou processa até `limit` PIs). Retorna quantas rodaram."""
+    done = 0
+    while limit is None or done < limit:
+        pi = claim_next_pdf()
+        if pi is None:
+            break
+        run_pdf(pi)
+        done += 1
+    return done
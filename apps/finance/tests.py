@@ -1,3 +1,125 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from apps.orders import models as order_models
+from apps.orders.tests import OrderFixtureMixin
+from . import pdfs
+from .models import ProformaInvoice
 
-# Create your tests here.
+
+class ProformaInvoicePdfTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, ALLOWED_HOSTS=['testserver'])
+        override.enable()
+        self.addCleanup(override.disable)
+        self.order = self._create_order()
+        self.line = order_models.OrderItem.objects.create(order=self.order, item=self.item, quantity=3)
+
+    def test_create_queues_pdf_and_worker_caches_by_content(self):
+        with mock.patch('apps.finance.models.pisa.CreatePDF') as create_pdf:
+            resp = self.client.post(reverse('finance:proforma-create', args=[self.order.pk]), {
+                'usd_rmb': '7.1', 'payment_terms': '30/70', 'deposit_percentage': '30',
+            })
+            pi = ProformaInvoice.objects.get(order=self.order)
+            self.assertRedirects(resp, reverse('finance:proforma-detail', args=[pi.pk]))
+            create_pdf.assert_not_called()
+        self.assertEqual(pi.pdf_status, ProformaInvoice.PDF_PENDING)
+        self.assertFalse(pi.pdf)
+        self.assertContains(self.client.get(resp['Location']), 'Generating PDF')
+
+        self.assertEqual(pdfs.run_pending(), 1)
+        self.assertIsNone(pdfs.claim_next_pdf())
+        pi.refresh_from_db()
+        self.assertEqual(pi.pdf_status, ProformaInvoice.PDF_READY)
+        self.assertTrue(pi.pdf.storage.exists(pi.pdf.name))
+        self.assertEqual(pi.pdf_hash, pi.content_hash())
+
+        # conteúdo igual: volta a ficar pronto sem renderizar
+        pi.request_pdf()
+        with mock.patch('apps.finance.models.pisa.CreatePDF') as create_pdf:
+            self.assertEqual(pdfs.run_pending(), 1)
+            create_pdf.assert_not_called()
+        pi.refresh_from_db()
+        self.assertEqual(pi.pdf_status, ProformaInvoice.PDF_READY)
+
+        # linha alterada: o hash muda e o PDF é refeito
+        self.line.quantity = 4
+        self.line.save()
+        self.assertNotEqual(pi.content_hash(), pi.pdf_hash)
+        pi.request_pdf()
+        pdfs.run_pending()
+        pi.refresh_from_db()
+        self.assertEqual(pi.pdf_hash, pi.content_hash())
+
+    def test_render_error_marks_pdf_failed(self):
+        pi = ProformaInvoice.objects.create(
+            order=self.order, usd_rmb=Decimal('7'), payment_terms='T', deposit_percentage=Decimal('30')
+        )
+        with mock.patch('apps.finance.models.pisa.CreatePDF', side_effect=ValueError('boom')):
+            pdfs.run_pending()
+        pi.refresh_from_db()
+        self.assertEqual(pi.pdf_status, ProformaInvoice.PDF_FAILED)
+        self.assertEqual(pi.pdf_error, 'boom')
+
+    def test_stale_running_pdf_is_reclaimed(self):
+        pi = ProformaInvoice.objects.create(
+            order=self.order, usd_rmb=Decimal('7'), payment_terms='T', deposit_percentage=Decimal('30')
+        )
+        self.assertEqual(pdfs.claim_next_pdf().pk, pi.pk)
+        # o worker ainda pode estar renderizando
+        self.assertIsNone(pdfs.claim_next_pdf())
+
+        # worker morreu sem terminar
+        ProformaInvoice.objects.filter(pk=pi.pk).update(
+            pdf_claimed_at=timezone.now() - pdfs.STALE_AFTER * 2
+        )
+        self.assertEqual(pdfs.run_pending(), 1)
+        pi.refresh_from_db()
+        self.assertEqual(pi.pdf_status, ProformaInvoice.PDF_READY)
+        self.assertFalse(pi.pdf_in_progress)
+
+    def test_request_during_render_discards_worker_result(self):
+        pi = ProformaInvoice.objects.create(
+            order=self.order, usd_rmb=Decimal('7'), payment_terms='T', deposit_percentage=Decimal('30')
+        )
+        running = pdfs.claim_next_pdf()
+        pi.request_pdf()  # ex.: "Regenerar PDF" no admin
+        pdfs.run_pdf(running)
+
+        pi.refresh_from_db()
+        self.assertEqual(pi.pdf_status, ProformaInvoice.PDF_PENDING)
+        self.assertIsNone(pi.pdf_claimed_at)
+        self.assertFalse(pi.pdf)
+        # o arquivo renderizado sem dono não fica no storage
+        self.assertFalse(running.pdf.storage.exists(running.pdf.name))
+
+        self.assertEqual(pdfs.run_pending(), 1)
+        pi.refresh_from_db()
+        self.assertEqual(pi.pdf_status, ProformaInvoice.PDF_READY)
+
+    def test_slow_worker_does_not_overwrite_reclaimed_pdf(self):
+        pi = ProformaInvoice.objects.create(
+            order=self.order, usd_rmb=Decimal('7'), payment_terms='T', deposit_percentage=Decimal('30')
+        )
+        slow = pdfs.claim_next_pdf()
+        ProformaInvoice.objects.filter(pk=pi.pk).update(
+            pdf_claimed_at=timezone.now() - pdfs.STALE_AFTER * 2
+        )
+        other = pdfs.claim_next_pdf()
+
+        with mock.patch('apps.finance.models.pisa.CreatePDF', side_effect=ValueError('boom')):
+            pdfs.run_pdf(slow)
+        pi.refresh_from_db()
+        self.assertEqual(pi.pdf_status, ProformaInvoice.PDF_RUNNING)
+        self.assertEqual(pi.pdf_error, '')
+
+        pdfs.run_pdf(other)
+        pi.refresh_from_db()
+        self.assertEqual(pi.pdf_status, ProformaInvoice.PDF_READY)
@@ -2,12 +2,13 @@ from django.views.generic import CreateView, DetailView, DeleteView, ListView
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
 from django.urls import reverse, reverse_lazy
+from agk_core.pagination import CursorPaginationMixin
 from apps.orders.models import Order
 from .models import ProformaInvoice
 from .forms import ProformaInvoiceForm
 
 
-class ProformaInvoiceListView(ListView):
+class ProformaInvoiceListView(CursorPaginationMixin, ListView):
     model = ProformaInvoice
     template_name = 'finance/proforma_invoice_list.html'
     context_object_name = 'proformas'
@@ -61,8 +62,8 @@ class ProformaInvoiceCreateView(CreateView):
         self.order.is_locked = True
         self.order.save()
 
-        # gera e salva o PDF
-        pi.generate_pdf()
+        # o PDF é gerado pelo worker (process_proforma_pdfs)
+        messages.info(self.request, "O PDF da Proforma Invoice está sendo gerado.")
 
         # redireciona sempre ao detail com pk válido
         return super().form_valid(form)
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from agk_core.search import IndexedSearchAdminMixin
 from . import models
 
 
@@ -19,10 +20,11 @@ class ItemPackagingVersionInline(admin.TabularInline):
 
 
 @admin.register(models.Item)
-class ItemAdmin(admin.ModelAdmin):
+class ItemAdmin(IndexedSearchAdminMixin, admin.ModelAdmin):
     list_display = [field.name for field in models.Item._meta.fields]
     list_filter   = ('category',)
     search_fields = ('p_code', 'name')
+    indexed_search_fields = search_fields
     ordering      = ('p_code',)
     readonly_fields = ()  # adicione aqui campos apenas-leitura, se quiser
     inlines = [ItemModelApplicationInline, ItemPackagingVersionInline]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.3 on 2026-10-17 15:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def close_duplicates_and_fill_pointer(apps, schema_editor):
+    """
+    Antes da constraint: se um item tiver mais de uma versão aberta, só a
+    mais recente continua aberta (as outras fecham na data dela). Depois
+    preenche Item.current_packaging_version.
+    """
+    Item = apps.get_model('inventory', 'Item')
+    ItemPackagingVersion = apps.get_model('inventory', 'ItemPackagingVersion')
+
+    open_versions = (
+        ItemPackagingVersion.objects
+            .filter(valid_to__isnull=True)
+            .order_by('item_id', '-valid_from', '-pk')
+            .values_list('pk', 'item_id', 'valid_from')
+    )
+    current = {}
+    for pk, item_id, valid_from in open_versions:
+        if item_id in current:
+            ItemPackagingVersion.objects.filter(pk=pk).update(valid_to=current[item_id][1])
+        else:
+            current[item_id] = (pk, valid_from)
+
+    for item_id, (pk, _) in current.items():
+        Item.objects.filter(pk=item_id).update(current_packaging_version_id=pk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_itempackagingversion_qty_per_master_box'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='current_packaging_version',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.itempackagingversion'),
+        ),
+        migrations.RunPython(close_duplicates_and_fill_pointer, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='itempackagingversion',
+            constraint=models.UniqueConstraint(condition=models.Q(('valid_to__isnull', True)), fields=('item',), name='inventory_unique_open_packaging_version'),
+        ),
+    ]
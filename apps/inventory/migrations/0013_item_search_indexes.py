@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-17 16:40
+
+from django.db import migrations
+from agk_core.search import CreateSearchIndex
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_item_current_packaging_version'),
+    ]
+
+    operations = [
+        CreateSearchIndex('item', 'p_code', name='inventory_item_p_code_search'),
+        CreateSearchIndex('item', 's_code', name='inventory_item_s_code_search'),
+        CreateSearchIndex('item', 'name', name='inventory_item_name_search'),
+    ]
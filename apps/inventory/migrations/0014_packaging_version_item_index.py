@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-17 16:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_item_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='itempackagingversion',
+            index=models.Index(fields=['item', '-valid_from'], name='inventory_pkgver_item_from_idx'),
+        ),
+        migrations.AlterField(
+            model_name='itempackagingversion',
+            name='item',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='packaging_versions', to='inventory.item'),
+        ),
+    ]
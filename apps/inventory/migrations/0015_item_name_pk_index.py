@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_customer_name_search_index'),
+        ('inventory', '0014_packaging_version_item_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['name', 'id'], name='inventory_item_name_pk_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.utils import timezone
+from agk_core import search
 from apps.core.models import  Supplier, Currency
 
 
@@ -84,6 +85,24 @@ class ModelApplication(models.Model):
         return self.name
     
 
+class ItemQuerySet(models.QuerySet):
+    def search(self, term):
+        """
+        Itens cujo p_code ou s_code começa com o termo, ou cujo nome o
+        contém; os que casam pelo código vêm primeiro. Usa os índices de
+        busca de agk_core.search (migração 0013).
+        """
+        by_code = search.starts_with('p_code', term) | search.starts_with('s_code', term)
+        return (
+            self.filter(by_code | search.contains('name', term))
+                .annotate(code_rank=models.Case(
+                    models.When(by_code, then=models.Value(0)),
+                    default=models.Value(1),
+                ))
+                .order_by('code_rank', 'name', 'pk')
+        )
+
+
 class Item(models.Model):
     p_code = models.CharField(max_length=50, unique=True)
     s_code = models.CharField(max_length=50)
@@ -108,17 +127,53 @@ class Item(models.Model):
 
     total_stock = models.PositiveIntegerField(default=0)
 
+    # versão de embalagem vigente (valid_to nulo), mantida pelos signals de
+    # ItemPackagingVersion; use select_related para resolver em lote
+    current_packaging_version = models.ForeignKey(
+        'ItemPackagingVersion',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    @property
-    def current_packaging_version(self):
-        return (
-            self.packaging_versions
-                .filter(valid_to__isnull=True)
+    objects = ItemQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        # o ponteiro é mantido pelas versões de embalagem: um Item carregado
+        # antes de uma troca de embalagem não pode sobrescrevê-lo ao ser salvo
+        if self.pk and not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'current_packaging_version'
+            ]
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def sync_current_packaging_versions(**filters):
+        """
+        Aponta current_packaging_version para a versão aberta mais recente
+        de cada item filtrado, em um único UPDATE com subquery.
+        """
+        current = (
+            ItemPackagingVersion.objects
+                .filter(item=models.OuterRef('pk'), valid_to__isnull=True)
                 .order_by('-valid_from')
-                .first()
+                .values('pk')[:1]
         )
+        return Item.objects.filter(**filters).update(
+            current_packaging_version=models.Subquery(current)
+        )
+
+    class Meta:
+        indexes = [
+            # lista de itens paginada por keyset (name, pk)
+            models.Index(fields=['name', 'id'], name='inventory_item_name_pk_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -148,6 +203,7 @@ class ItemPackagingVersion(models.Model):
         Item,
         related_name='packaging_versions',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     net_weight = models.DecimalField(max_digits=10, decimal_places=4)
     package_gross_weight = models.DecimalField(max_digits=10, decimal_places=4)
@@ -165,6 +221,21 @@ class ItemPackagingVersion(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 
+    class Meta:
+        constraints = [
+            # no máximo uma versão aberta (vigente) por item
+            models.UniqueConstraint(
+                fields=['item'],
+                condition=models.Q(valid_to__isnull=True),
+                name='inventory_unique_open_packaging_version',
+            ),
+        ]
+        indexes = [
+            # histórico de versões de um item, da mais recente para a mais
+            # antiga; a versão vigente usa a constraint parcial acima
+            models.Index(fields=['item', '-valid_from'], name='inventory_pkgver_item_from_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         # ao criar um novo, fecha a anterior
         if not self.pk:
@@ -0,0 +1,31 @@
+"""
+Mantém Item.current_packaging_version apontando para a versão de embalagem
+aberta do item a cada gravação ou remoção de ItemPackagingVersion.
+
+Conectado antes dos receivers de apps.orders (ordem de INSTALLED_APPS), que
+já leem o ponteiro atualizado ao recalcular os resumos logísticos.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Item, ItemPackagingVersion
+
+
+def _item_is_cached(instance):
+    return ItemPackagingVersion._meta.get_field('item').is_cached(instance)
+
+
+@receiver(post_save, sender=ItemPackagingVersion)
+def update_current_packaging_version(sender, instance, **kwargs):
+    if instance.valid_to is None:
+        Item.objects.filter(pk=instance.item_id).update(current_packaging_version=instance)
+        if _item_is_cached(instance):
+            instance.item.current_packaging_version = instance
+    else:
+        Item.sync_current_packaging_versions(pk=instance.item_id)
+        if _item_is_cached(instance):
+            instance.item.refresh_from_db(fields=['current_packaging_version'])
+
+
+@receiver(post_delete, sender=ItemPackagingVersion)
+def clear_current_packaging_version(sender, instance, **kwargs):
+    Item.sync_current_packaging_versions(pk=instance.item_id)
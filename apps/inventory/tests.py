@@ -1,3 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from apps.inventory import models as inv_models
+from apps.orders.tests import OrderFixtureMixin
+
+
+class ItemAutocompleteTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for p_code, s_code, name in [('AB-100', 'X1', 'Bolt'), ('ZZ-1', 'AB-9', 'Nut'), ('QQ-2', 'Q2', 'Cable ab')]:
+            item = inv_models.Item.objects.get(pk=self.item.pk)
+            item.pk, item.p_code, item.s_code, item.name = None, p_code, s_code, name
+            item.save()
+        self.user = get_user_model().objects.create_user('u', password='p')
+        self.url = reverse('inventory:item-autocomplete')
+
+    def test_search_ranks_code_prefix_before_name(self):
+        names = list(inv_models.Item.objects.search(' AB ').values_list('name', flat=True))
+        self.assertEqual(names, ['Bolt', 'Nut', 'Cable ab'])
+
+    def test_endpoint_returns_top_matches_in_one_query(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get(self.url, {'q': 'ab-1'}).json()['results']
+        self.assertEqual(results, [{'id': results[0]['id'], 'text': 'AB-100 — Bolt'}])
+        self.assertEqual(sum('FROM "inventory_item"' in q['sql'] for q in queries), 1)
+        self.assertEqual(self.client.get(self.url, {'q': 'a'}).json(), {'results': []})
+
+    def test_endpoint_requires_login(self):
+        self.assertEqual(self.client.get(self.url, {'q': 'ab'}).status_code, 302)
+
+
+class ItemSearchTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for p_code, name in [('AB-100', 'Bolt'), ('ZZ-1', 'Cable AB')]:
+            item = inv_models.Item.objects.get(pk=self.item.pk)
+            item.pk, item.p_code, item.name = None, p_code, name
+            item.save()
+        self.user = get_user_model().objects.create_superuser('admin', password='p')
+        self.client.force_login(self.user)
+
+    def test_list_filters_by_code_or_name_with_indexed_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('inventory:item-list'), {'q': ' ab '})
+        self.assertEqual([i.name for i in response.context['object_list']], ['Bolt', 'Cable AB'])
+        item_sql = [q['sql'] for q in queries if 'FROM "inventory_item"' in q['sql']]
+        self.assertTrue(item_sql)
+        self.assertTrue(all('LOWER("inventory_item"."name")' in sql for sql in item_sql))
+
+    def test_admin_search_requires_every_word(self):
+        response = self.client.get(reverse('admin:inventory_item_changelist'), {'q': 'cable ab'})
+        self.assertEqual([i.name for i in response.context['cl'].result_list], ['Cable AB'])
@@ -9,6 +9,7 @@ urlpatterns = [
     path('item/<int:pk>/edit/', views.ItemCreateUpdateView.as_view(), name='item-edit'),
     path('item/<int:pk>/delete/', views.ItemDeleteView.as_view(), name='item-delete'),
     path('item/<int:pk>/packaging/', views.ItemPackagingUpdateView.as_view(), name='item-packaging'),
+    path('item/autocomplete/', views.ItemAutocompleteView.as_view(), name='item-autocomplete'),
 ]
 
 for name in [
@@ -6,16 +6,47 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.db import transaction
 from django.utils import timezone
+from agk_core import search
+from agk_core.pagination import CursorPaginationMixin
 from . import models
 from . import forms
 
 
-class ItemListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class ItemListView(LoginRequiredMixin, PermissionRequiredMixin, CursorPaginationMixin, ListView):
     model = models.Item
     template_name = 'inventory/item_list.html'
     context_object_name = 'items'
     paginate_by = 25
     permission_required = 'inventory.view_item'
+    cursor_keys = ('name', 'pk')
+
+    def get_queryset(self):
+        queryset = (
+            super().get_queryset()
+                .select_related('subcategory', 'project', 'supplier')
+                .order_by('name', 'pk')
+        )
+        q = self.request.GET.get('q', '').strip()
+        if q:
+            queryset = queryset.filter(search.contains_any(('p_code', 'name'), q))
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['q'] = self.request.GET.get('q', '')
+        return ctx
+
+
+class ItemAutocompleteView(LoginRequiredMixin, View):
+    """Busca de itens por p_code / s_code (prefixo) ou nome, em JSON."""
+
+    def get(self, request):
+        return search.autocomplete_response(
+            request,
+            models.Item.objects.search,
+            label=lambda item: f"{item.p_code} — {item.name}",
+        )
+
 
 CREATE_URLS = {
     'category':           'inventory:category-create',
@@ -229,10 +260,6 @@ class ItemPackagingUpdateView(View):
 
             formset.save_m2m()
 
-            for f in models.ItemPackagingVersion.PACKAGING_FIELDS:
-                setattr(self.item, f, getattr(instances[-1], f))
-            self.item.save()
-
             return redirect('inventory:item-edit', pk=self.item.pk)
 
         return render(request, self.template_name, {
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem, OrderBatch, BatchItem, BatchStage, Stage
+from .models import Order, OrderItem, OrderItemImportJob, OrderBatch, BatchItem, BatchLogisticsSummary, BatchStage, DashboardAggregate, Stage
 
 
 # —— Inline para OrderItem dentro de Order ——
@@ -79,3 +79,25 @@ class StageAdmin(admin.ModelAdmin):
     list_display  = ('id', 'name',)
     list_filter   = ('name',)
     search_fields = ('name',)
+
+
+@admin.register(OrderItemImportJob)
+class OrderItemImportJobAdmin(admin.ModelAdmin):
+    list_display  = ('id', 'order', 'status', 'processed_rows', 'created_rows', 'error_count', 'created_at', 'finished_at')
+    list_filter   = ('status',)
+    search_fields = ('order__id',)
+    readonly_fields = ('created_at', 'updated_at', 'started_at', 'finished_at')
+
+
+@admin.register(BatchLogisticsSummary)
+class BatchLogisticsSummaryAdmin(admin.ModelAdmin):
+    list_display  = ('batch', 'box_qty', 'net_weight', 'gross_weight', 'cbm', 'updated_at')
+    search_fields = ('batch__batch_code',)
+    readonly_fields = ('box_qty', 'net_weight', 'gross_weight', 'cbm', 'updated_at')
+
+
+@admin.register(DashboardAggregate)
+class DashboardAggregateAdmin(admin.ModelAdmin):
+    list_display  = ('company', 'customer', 'month', 'status', 'value', 'quantity', 'box_qty', 'cbm', 'refreshed_at')
+    list_filter   = ('status', 'company')
+    search_fields = ('customer__name',)
@@ -0,0 +1,169 @@
+"""
+Agregados do dashboard (DashboardAggregate).
+
+refresh() reconstrói a tabela inteira com três consultas agrupadas (linhas
+das orders, itens de lote e resumos logísticos dos lotes) e é chamado
+periodicamente pelo cron (manage.py refresh_dashboard). A página só lê a
+tabela já agregada, então o custo não cresce com o volume de orders.
+"""
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import DateField, F, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from . import logistics
+from .models import BatchItem, BatchLogisticsSummary, DashboardAggregate, OrderBatch, OrderItem
+
+
+ZERO = Decimal('0')
+TOTAL_FIELDS = ['value', 'quantity', 'box_qty', 'cbm']
+# status de lote fora do valor em aberto
+CLOSED_STATUSES = ('delivered', 'canceled')
+PRODUCTION_STATUS = 'production'
+TRANSIT_STATUS = 'transit'
+TOP_CUSTOMERS = 10
+RECENT_MONTHS = 12
+
+
+def _grouped(queryset, order_path, status_path=None, **totals):
+    """values() por companhia, cliente e mês da order (e status) + totais."""
+    dims = {
+        'company_id': F(f'{order_path}company'),
+        'customer_id': F(f'{order_path}customer'),
+        'month': TruncMonth(f'{order_path}created_at', output_field=DateField()),
+    }
+    if status_path:
+        dims['status'] = F(status_path)
+    return queryset.order_by().values(**dims).annotate(**totals)
+
+
+def build_rows():
+    """
+    {(company_id, customer_id, month, status): totais}. Itens de lote
+    entram no status do lote; o que sobra das linhas das orders (pedido
+    menos alocado) entra em STATUS_OPEN.
+
+    Order não tem status próprio: o que encerra uma quantidade é o lote em
+    que ela está. Por isso as linhas de todas as orders entram na conta e o
+    alocado em lotes entregues ou cancelados sai do aberto como qualquer
+    outro lote (vai para a linha do status do lote, que summary() deixa fora
+    de open_value via CLOSED_STATUSES). Uma order toda alocada em lotes
+    fechados não soma nada ao valor em aberto.
+    """
+    rows = {}
+
+    def add(key, **values):
+        row = rows.setdefault(key, dict.fromkeys(TOTAL_FIELDS, ZERO))
+        for field, value in values.items():
+            row[field] += value or ZERO
+
+    ordered = _grouped(
+        OrderItem.objects, 'order__',
+        total_value=Sum(F('quantity') * F('sale_price')),
+        total_quantity=Sum('quantity'),
+    )
+    for r in ordered:
+        key = (r['company_id'], r['customer_id'], r['month'], DashboardAggregate.STATUS_OPEN)
+        add(key, value=r['total_value'], quantity=r['total_quantity'])
+
+    allocated = _grouped(
+        BatchItem.objects, 'batch__order__', 'batch__status',
+        total_value=Sum(F('quantity') * F('order_item__sale_price')),
+        total_quantity=Sum('quantity'),
+    )
+    for r in allocated:
+        dims = (r['company_id'], r['customer_id'], r['month'])
+        add(dims + (r['status'],), value=r['total_value'], quantity=r['total_quantity'])
+        add(dims + (DashboardAggregate.STATUS_OPEN,),
+            value=-(r['total_value'] or ZERO), quantity=-(r['total_quantity'] or ZERO))
+
+    packed = _grouped(
+        BatchLogisticsSummary.objects, 'batch__order__', 'batch__status',
+        total_box_qty=Sum('box_qty'),
+        total_cbm=Sum('cbm'),
+    )
+    for r in packed:
+        key = (r['company_id'], r['customer_id'], r['month'], r['status'])
+        add(key, box_qty=r['total_box_qty'], cbm=r['total_cbm'])
+
+    return {key: row for key, row in rows.items() if any(row.values())}
+
+
+@transaction.atomic
+def refresh():
+    """Reconstrói DashboardAggregate; devolve o número de linhas gravadas."""
+    logistics.ensure_summaries(OrderBatch.objects.all())
+    now = timezone.now()
+    aggregates = [
+        DashboardAggregate(
+            company_id=company_id,
+            customer_id=customer_id,
+            month=month,
+            status=status,
+            value=row['value'].quantize(Decimal('0.01')),
+            quantity=int(row['quantity']),
+            box_qty=row['box_qty'].quantize(logistics.PLACES),
+            cbm=row['cbm'].quantize(logistics.PLACES),
+            refreshed_at=now,
+        )
+        for (company_id, customer_id, month, status), row in build_rows().items()
+    ]
+    DashboardAggregate.objects.all().delete()
+    DashboardAggregate.objects.bulk_create(aggregates)
+    return len(aggregates)
+
+
+def _totals(queryset, dim):
+    return (
+        queryset
+            .values(dim)
+            .annotate(
+                total_value=Sum('value'), total_quantity=Sum('quantity'),
+                total_box_qty=Sum('box_qty'), total_cbm=Sum('cbm'),
+            )
+    )
+
+
+def _labeled(rows, label):
+    """Lista de linhas com `label` (coluna exibida na tabela)."""
+    rows = list(rows)
+    for row in rows:
+        row['label'] = label(row)
+    return rows
+
+
+def summary():
+    """Contexto do dashboard, lido só da tabela agregada."""
+    aggregates = DashboardAggregate.objects.order_by()
+    labels = {DashboardAggregate.STATUS_OPEN: 'Open (not batched)', **dict(OrderBatch.STATUS_CHOICES)}
+
+    by_status = _labeled(
+        _totals(aggregates, 'status').annotate(last_refresh=Max('refreshed_at')),
+        lambda row: labels.get(row['status'], row['status']),
+    )
+    by_status.sort(key=lambda row: -row['total_value'])
+
+    def status_total(field, *statuses):
+        return sum((row[field] for row in by_status if row['status'] in statuses), ZERO)
+
+    return {
+        'open_value': sum(
+            (row['total_value'] for row in by_status if row['status'] not in CLOSED_STATUSES), ZERO
+        ),
+        'units_in_production': status_total('total_quantity', PRODUCTION_STATUS),
+        'cbm_in_transit': status_total('total_cbm', TRANSIT_STATUS),
+        'refreshed_at': max((row['last_refresh'] for row in by_status), default=None),
+        'by_status': by_status,
+        'by_company': _labeled(
+            _totals(aggregates, 'company__name').order_by('company__name'),
+            lambda row: row['company__name'],
+        ),
+        'by_customer': _labeled(
+            _totals(aggregates, 'customer__name').order_by('-total_value')[:TOP_CUSTOMERS],
+            lambda row: row['customer__name'],
+        ),
+        'by_month': _labeled(
+            _totals(aggregates, 'month').order_by('-month')[:RECENT_MONTHS],
+            lambda row: f"{row['month']:%Y-%m}",
+        ),
+    }
@@ -4,10 +4,15 @@ from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Row, Column, Div, Field, HTML, Submit
 from crispy_forms.bootstrap import AppendedText
 from django.core.exceptions import ValidationError
-from django.forms.models import BaseInlineFormSet, inlineformset_factory
+from django.forms.models import BaseInlineFormSet, BaseModelFormSet, ModelChoiceIteratorValue, inlineformset_factory
+from django.db import transaction
 from django.db.models import Sum
+from django.urls import reverse, reverse_lazy
+from django.utils.functional import cached_property
 from .models import Order, OrderItem, OrderBatch, BatchItem, BatchStage
-from apps.pricing.models import CustomerItemMargin
+from apps.core.widgets import AutocompleteSelect
+from apps.inventory.models import Item, ItemPackagingVersion
+from apps.pricing.margins import margin_map
 
 
 from django import forms
@@ -129,6 +134,118 @@ class OrderForm(forms.ModelForm):
         )
 
 
+class SharedModelChoices:
+    """
+    Opções de um ModelChoiceField avaliadas uma única vez e compartilhadas
+    por todos os forms de um formset. Sem isso, cada form refaz a query do
+    queryset ao renderizar o seu <select>.
+
+    `options` limita o que é listado (ex.: só os valores já escolhidos, em
+    selects de autocomplete); a validação continua usando `queryset`.
+    """
+
+    def __init__(self, queryset, empty_label='---------', options=None):
+        self.queryset = queryset
+        self.options = queryset if options is None else options
+        self.empty_label = empty_label
+
+    @cached_property
+    def objects(self):
+        return list(self.options)
+
+    @cached_property
+    def choices(self):
+        return [('', self.empty_label)] + [
+            (ModelChoiceIteratorValue(obj.pk, obj), str(obj))
+            for obj in self.objects
+        ]
+
+    def apply(self, field):
+        # o queryset continua valendo para a validação; só as opções são fixas
+        field.queryset = self.queryset
+        field.choices = self.choices
+
+
+class PackagingVersionChoices:
+    """
+    Opções de packaging_version restritas ao item de cada linha. As versões
+    de todos os itens das linhas são lidas em uma única query, agrupadas por
+    item, e o rótulo é montado só com a data de validade (o __str__ de
+    ItemPackagingVersion consultaria o item a cada opção).
+    """
+
+    def __init__(self, item_ids, empty_label='---------'):
+        self.item_ids = {pk for pk in item_ids if pk}
+        self.empty_label = empty_label
+
+    @staticmethod
+    def label(version):
+        return f"{version.valid_from:%Y-%m-%d %H:%M}"
+
+    @cached_property
+    def by_item(self):
+        grouped = {}
+        qs = (
+            ItemPackagingVersion.objects
+                .filter(item_id__in=self.item_ids)
+                .order_by('item_id', '-valid_from')
+        )
+        for pv in qs:
+            grouped.setdefault(pv.item_id, []).append(
+                (ModelChoiceIteratorValue(pv.pk, pv), self.label(pv))
+            )
+        return grouped
+
+    def apply(self, field, item_id):
+        # a validação aceita só versões do próprio item
+        if item_id:
+            field.queryset = ItemPackagingVersion.objects.filter(item_id=item_id)
+        else:
+            field.queryset = ItemPackagingVersion.objects.none()
+        field.choices = [('', self.empty_label)] + self.by_item.get(item_id, [])
+
+
+def _pk(value):
+    """pk de uma instância, de um id ou do valor postado."""
+    try:
+        return int(getattr(value, 'pk', value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _row_item_pk(form):
+    """
+    Item da linha: o postado (a edição pode trocar o item de uma linha já
+    gravada), o já gravado ou o inicial (importação).
+    """
+    field = form.fields.get('item')
+    if form.is_bound and field is not None and not field.disabled:
+        posted = _pk(form.data.get(form.add_prefix('item')))
+        if posted:
+            return posted
+    if form.instance.item_id:
+        return form.instance.item_id
+    if field is None or form.is_bound:
+        return None
+    return _pk(form.initial.get('item'))
+
+
+def selected_pks(formset, field_name):
+    """
+    pks escolhidos no campo FK `field_name` por todas as linhas do formset:
+    gravados, iniciais e postados.
+    """
+    pks = {getattr(obj, f'{field_name}_id') for obj in formset.get_queryset()}
+    pks.update(_pk(row.get(field_name)) for row in formset.initial_extra or [])
+    if formset.is_bound:
+        pks.update(
+            _pk(value) for key, value in formset.data.items()
+            if key.startswith(f'{formset.prefix}-') and key.endswith(f'-{field_name}')
+        )
+    pks.discard(None)
+    return pks
+
+
 class OrderItemForm(forms.ModelForm):
     margin = forms.DecimalField(
         label="Margem (%)",
@@ -147,8 +264,10 @@ class OrderItemForm(forms.ModelForm):
         model = OrderItem
         fields = ('item', 'packaging_version', 'quantity', 'margin')
         widgets = {
-            'item': forms.Select(attrs={'class': 'form-select form-select-sm', 
-                                        'style': 'max-width:300px;',}
+            'item': AutocompleteSelect(
+                url=reverse_lazy('inventory:item-autocomplete'),
+                attrs={'class': 'form-select form-select-sm',
+                       'style': 'max-width:300px;',}
             ),
             'quantity': forms.NumberInput(attrs={'class': 'form-control form-control-sm',
                                                  'style': 'width:100px;', 
@@ -156,34 +275,78 @@ class OrderItemForm(forms.ModelForm):
             }),
         }
 
-    def __init__(self, *args, customer=None, usd_rmb : Decimal=None, **kwargs):
+    def __init__(self, *args, customer=None, usd_rmb : Decimal=None, margins=None, locked=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.customer = customer
         self.usd_rmb = usd_rmb or Decimal('0')
 
-        # se for criação (sem pk) e tiver customer, tentar pré-preencher
+        # se for criação (sem pk) e tiver customer, tentar pré-preencher;
+        # `margins` é o mapa {item_id: margin} do cliente, carregado uma vez
+        # pela view para o formset inteiro
         if not self.instance.pk and customer and 'item' in self.initial:
-            try:
-                cim = CustomerItemMargin.objects.get(
-                    customer=customer,
-                    item=self.initial['item']
-                )
-                self.fields['margin'].initial = cim.margin
-
-            except CustomerItemMargin.DoesNotExist:
-                pass
-            
-        if self.instance.pk and self.instance.order.is_locked:
+            if margins is None:
+                margins = margin_map(customer)
+            item = self.initial['item']
+            margin = margins.get(getattr(item, 'pk', item))
+            if margin is not None:
+                self.fields['margin'].initial = margin
+
+        # `locked` vem do formset (lido uma vez da order); sem ele, consulta
+        if locked is None:
+            locked = bool(self.instance.pk) and self.instance.order.is_locked
+        if self.instance.pk and locked:
             self.fields['packaging_version'].disabled = True
             self.fields['packaging_version'].widget.attrs['disabled'] = 'disabled'
 
 
-OrderItemFormSet = inlineformset_factory(
-    Order, OrderItem,
-    form=OrderItemForm,
-    extra=1,
-    can_delete=True
-)
+class BaseOrderItemFormSet(BaseInlineFormSet):
+    """
+    Formset de OrderItem que resolve uma única vez, para todas as linhas,
+    o que o OrderItemForm consultaria por form: mapa de margens do cliente,
+    trava da order e as opções dos selects de item e de embalagem. Qualquer
+    um deles pode vir pronto da view (form_kwargs / item_choices /
+    packaging_version_choices).
+
+    O select de item é de autocomplete: lista só os itens já escolhidos nas
+    linhas, os demais vêm do endpoint inventory:item-autocomplete.
+    """
+
+    def __init__(self, *args, item_choices=None, packaging_version_choices=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        item_pks = selected_pks(self, 'item')
+        self.item_choices = item_choices or SharedModelChoices(
+            Item.objects.all(), options=Item.objects.filter(pk__in=item_pks)
+        )
+        self.packaging_version_choices = packaging_version_choices or PackagingVersionChoices(
+            item_pks
+        )
+
+        self.form_kwargs.setdefault('locked', bool(self.instance.is_locked))
+        customer = self.form_kwargs.get('customer')
+        if customer and self.form_kwargs.get('margins') is None:
+            self.form_kwargs['margins'] = margin_map(customer)
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        # vale também para o empty_form, que é recriado a cada acesso
+        self.item_choices.apply(form.fields['item'])
+        self.packaging_version_choices.apply(
+            form.fields['packaging_version'], _row_item_pk(form)
+        )
+
+
+def order_item_formset_factory(extra=1):
+    """OrderItemFormSet com o número de linhas extras desejado."""
+    return inlineformset_factory(
+        Order, OrderItem,
+        form=OrderItemForm,
+        formset=BaseOrderItemFormSet,
+        extra=extra,
+        can_delete=True
+    )
+
+
+OrderItemFormSet = order_item_formset_factory()
 
 class OrderItemPackagingForm(forms.ModelForm):
     class Meta:
@@ -193,16 +356,24 @@ class OrderItemPackagingForm(forms.ModelForm):
             'packaging_version': forms.Select(attrs={'class': 'form-select form-select-sm'}),
         }
 
+
+class BaseOrderItemPackagingFormSet(BaseModelFormSet):
+    """
+    Cada linha só lista as versões do seu item, em ordem decrescente de
+    validade, todas carregadas em uma única query para a página.
+    """
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # filtra só as versões desse item, em ordem decrescente de validade
-        if self.instance and self.instance.item_id:
-            qs = self.instance.item.packaging_versions.order_by('-valid_from')
-            self.fields['packaging_version'].queryset = qs
-            # opcional: personalizar a label de cada opção
-            self.fields['packaging_version'].label_from_instance = (
-                lambda obj: f"{obj.valid_from:%Y-%m-%d %H:%M}"
-            )
+        self.packaging_version_choices = PackagingVersionChoices(
+            oi.item_id for oi in self.get_queryset()
+        )
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        self.packaging_version_choices.apply(
+            form.fields['packaging_version'], form.instance.item_id
+        )
 
 
 class BatchItemForm(forms.ModelForm):
@@ -210,11 +381,16 @@ class BatchItemForm(forms.ModelForm):
         model = BatchItem
         fields = ('order_item', 'quantity')
         widgets = {
-            'order_item': forms.Select(attrs={'class': 'form-select'}),
+            'order_item': AutocompleteSelect(attrs={'class': 'form-select'}),
             'quantity': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
         }
 
 
+def batch_order_item_queryset(order):
+    """OrderItem do pedido com saldo anotado e item carregado (para os selects de lote)."""
+    return order.order_items.with_balances().select_related('item')
+
+
 class BaseBatchItemFormSet(BaseInlineFormSet):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -223,11 +399,22 @@ class BaseBatchItemFormSet(BaseInlineFormSet):
         if not order and 'initial' in kwargs:
             order = kwargs['initial'].get('order')
 
-        allowed_qs = order.order_items.all() if order else OrderItem.objects.none()
-        for form in self.forms:
-            form.fields['order_item'].queryset = allowed_qs
+        allowed_qs = batch_order_item_queryset(order) if order else OrderItem.objects.none()
+        # lista só os já escolhidos; os demais vêm do autocomplete da order
+        self.order_item_choices = SharedModelChoices(
+            allowed_qs, options=allowed_qs.filter(pk__in=selected_pks(self, 'order_item'))
+        )
+        self.order_item_url = (
+            reverse('orders:order-item-autocomplete', args=[order.pk]) if order else None
+        )
 
-        self.empty_form.fields['order_item'].queryset = allowed_qs
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        # vale também para o empty_form, que é recriado a cada acesso
+        field = form.fields['order_item']
+        self.order_item_choices.apply(field)
+        if self.order_item_url:
+            field.widget.attrs['data-autocomplete-url'] = self.order_item_url
 
     def clean(self):
         super().clean()
@@ -249,20 +436,16 @@ class BaseBatchItemFormSet(BaseInlineFormSet):
             if oi and qty is not None and not delete:
                 forms_per_item.setdefault(oi, []).append(form)
 
-        # 2) Para cada OrderItem, calcula:
+        # 2) Para todos os OrderItem de uma vez:
         #    shipped_other = soma de todas as quantidades já embarcadas
         #                     EM OUTRAS batches (batch != esta)
         #    max_shippable = quantidade total do pedido - shipped_other
+        quantities, shipped = self._lock_and_sum_shipped(
+            [oi.pk for oi in forms_per_item]
+        )
         for oi, forms in forms_per_item.items():
-            # soma o que já foi embarcado fora desta batch
-            shipped_other = (
-                oi.batchitem_set
-                  .exclude(batch=self.instance)  # exclui os desta batch
-                  .aggregate(total=Sum('quantity'))['total']
-                or 0
-            )
-
-            max_shippable = oi.quantity - shipped_other
+            shipped_other = shipped.get(oi.pk, 0)
+            max_shippable = quantities.get(oi.pk, oi.quantity) - shipped_other
             new_total = sum(f.cleaned_data['quantity'] for f in forms)
 
             if new_total > max_shippable:
@@ -280,6 +463,35 @@ class BaseBatchItemFormSet(BaseInlineFormSet):
         if errors:
             # dispara um ValidationError geral para interromper o save
             raise ValidationError("Existem itens com quantidade maior do que o disponível.")
+
+    def _lock_and_sum_shipped(self, order_item_ids):
+        """
+        Trava as linhas dos OrderItem envolvidos (select_for_update, quando
+        dentro de uma transação) e soma, em uma única query agrupada, o que
+        já foi embarcado em outras batches. Com a trava, dois lotes salvos ao
+        mesmo tempo não conseguem ultrapassar a quantidade do pedido: o
+        segundo espera o primeiro terminar e já enxerga o que ele gravou.
+        Retorna ({order_item_id: quantity}, {order_item_id: shipped_other}).
+        """
+        if not order_item_ids:
+            return {}, {}
+
+        items = OrderItem.objects.filter(pk__in=order_item_ids)
+        if transaction.get_connection().in_atomic_block:
+            items = items.select_for_update()
+        quantities = dict(items.order_by('pk').values_list('pk', 'quantity'))
+
+        others = BatchItem.objects.filter(order_item_id__in=order_item_ids)
+        if self.instance.pk:
+            others = others.exclude(batch=self.instance)  # exclui os desta batch
+        shipped = dict(
+            others
+                .order_by()
+                .values('order_item_id')
+                .annotate(total=Sum('quantity'))
+                .values_list('order_item_id', 'total')
+        )
+        return quantities, shipped
         
 # final inlineformset, referenciando o BaseBatchItemFormSet
 BatchItemFormSet = inlineformset_factory(
@@ -0,0 +1,344 @@
+"""
+Importação em massa de OrderItem a partir de planilhas (.csv / .xlsx).
+
+Todo o processamento é feito por conjunto: os nomes dos itens são resolvidos
+em uma única query (já com a embalagem vigente), as margens do cliente também,
+os preços são calculados sobre o DataFrame e a gravação é feita com
+bulk_create dentro de uma única transação.
+
+Arquivos grandes são lidos em blocos de CHUNK_SIZE linhas (read_csv com
+chunksize / openpyxl em modo read-only), de forma que a memória fica
+limitada ao tamanho do bloco e não ao tamanho do arquivo.
+"""
+import zipfile
+from decimal import Decimal
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from django.db import transaction
+from django.db.models.functions import Lower
+from apps.inventory.models import Item
+from .models import OrderItem
+from . import pricing
+
+
+REQUIRED_COLUMNS = {'item', 'quantity'}
+BULK_BATCH_SIZE = 500
+CHUNK_SIZE = 2000
+MAX_ERRORS = 500
+
+
+class InvalidColumnsError(ValueError):
+    """O cabeçalho do arquivo não tem as colunas obrigatórias."""
+
+
+# erros de abertura/leitura do arquivo (CSV malformado, encoding, XLSX
+# corrompido); o resto (banco, bugs) não é problema do arquivo enviado
+READ_ERRORS = (
+    OSError, UnicodeDecodeError, pd.errors.ParserError, pd.errors.EmptyDataError,
+    zipfile.BadZipFile, InvalidFileException,
+)
+
+
+def read_upload(file):
+    """Lê o arquivo enviado em um DataFrame (CSV ou Excel)."""
+    if file.name.lower().endswith('.csv'):
+        return pd.read_csv(file)
+    return pd.read_excel(file)
+
+
+def normalize_columns(df):
+    """Normaliza o cabeçalho e informa se as colunas obrigatórias existem."""
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    return REQUIRED_COLUMNS.issubset(df.columns)
+
+
+def iter_chunks(file, chunk_size=CHUNK_SIZE):
+    """
+    Lê o arquivo em blocos de no máximo chunk_size linhas.
+    Cada bloco é um DataFrame com o cabeçalho já normalizado e o índice
+    contínuo em relação ao arquivo (linha 1 = primeira linha de dados).
+    Levanta InvalidColumnsError se faltarem colunas obrigatórias.
+    """
+    if file.name.lower().endswith('.csv'):
+        chunks = pd.read_csv(file, chunksize=chunk_size)
+    else:
+        chunks = _iter_xlsx_chunks(file, chunk_size)
+
+    for chunk in chunks:
+        if not normalize_columns(chunk):
+            raise InvalidColumnsError(
+                f'Colunas inválidas, precisa ter: {REQUIRED_COLUMNS}'
+            )
+        yield chunk
+
+
+def count_rows(file):
+    """
+    Estimativa barata do número de linhas de dados, para exibir progresso.
+    CSV: conta quebras de linha; XLSX: usa a dimensão gravada na planilha.
+    Retorna None quando não é possível estimar.
+    """
+    try:
+        if file.name.lower().endswith('.csv'):
+            lines = sum(block.count(b'\n') for block in iter(lambda: file.read(1 << 16), b''))
+            return max(lines - 1, 0)
+        wb = load_workbook(file, read_only=True)
+        try:
+            max_row = wb.active.max_row
+        finally:
+            wb.close()
+        return max(max_row - 1, 0) if max_row else None
+    except Exception:
+        return None
+    finally:
+        file.seek(0)
+
+
+def _iter_xlsx_chunks(file, chunk_size):
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise InvalidColumnsError(
+                f'Colunas inválidas, precisa ter: {REQUIRED_COLUMNS}'
+            )
+        columns = ['' if c is None else c for c in header]
+
+        buffer, start = [], 0
+        for row in rows:
+            # o modo read-only costuma devolver linhas vazias no fim da planilha
+            if all(v is None for v in row):
+                continue
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield _frame(buffer, columns, start)
+                start += len(buffer)
+                buffer = []
+        if buffer:
+            yield _frame(buffer, columns, start)
+    finally:
+        wb.close()
+
+
+def _frame(rows, columns, start):
+    return pd.DataFrame(
+        rows, columns=columns, index=range(start, start + len(rows))
+    )
+
+
+def resolve_items(names):
+    """
+    Resolve nomes (case-insensitive) em uma única query.
+    Retorna {nome_em_minúsculas: Item}; em caso de nomes repetidos no
+    cadastro, fica o item de menor pk.
+    """
+    keys = {str(n).strip().lower() for n in names}
+    items = {}
+    qs = (
+        Item.objects
+            .annotate(name_lower=Lower('name'))
+            .filter(name_lower__in=keys)
+            .select_related('currency', 'current_packaging_version')
+            .order_by('pk')
+    )
+    for item in qs:
+        items.setdefault(item.name_lower, item)
+    return items
+
+
+class ItemNameIndex:
+    """
+    Índice nome (minúsculo) → pk, montado uma vez por request.
+    Cada nome é consultado no banco uma única vez, mesmo lendo o arquivo em
+    vários blocos; nomes inexistentes ficam registrados como None.
+    """
+
+    def __init__(self):
+        self._pks = {}
+
+    def resolve(self, keys):
+        keys = set(keys)
+        missing = keys - self._pks.keys()
+        if missing:
+            qs = (
+                Item.objects
+                    .annotate(name_lower=Lower('name'))
+                    .filter(name_lower__in=missing)
+                    .order_by('pk')
+                    .values_list('name_lower', 'pk')
+            )
+            for name, pk in qs:
+                self._pks.setdefault(name, pk)
+            for key in missing:
+                self._pks.setdefault(key, None)
+        return {key: self._pks[key] for key in keys}
+
+
+def parse_rows(df):
+    """
+    Monta um DataFrame de trabalho com número da linha, nome, chave de busca
+    e quantidade numérica (NaN quando inválida).
+    """
+    frame = pd.DataFrame({
+        'line': df.index + 1,
+        'name': df['item'].astype(str).str.strip(),
+        'quantity': pd.to_numeric(df['quantity'], errors='coerce'),
+    }, index=df.index)
+    frame['key'] = frame['name'].str.lower()
+    return frame
+
+
+def valid_quantity_mask(quantity):
+    """Quantidades válidas: numéricas, inteiras e maiores que zero."""
+    return (quantity > 0) & (quantity % 1 == 0)
+
+
+def validate_new_order_items(chunks, index=None):
+    """
+    Valida em uma única passada as linhas de um arquivo para um pedido novo.
+    Retorna (rows, errors): rows é uma lista compacta [[item_pk, quantity], ...]
+    das linhas válidas, pronta para ir para a sessão.
+    """
+    index = index or ItemNameIndex()
+    rows, errors, seen = [], [], set()
+
+    for chunk in chunks:
+        frame = parse_rows(chunk)
+        frame['pk'] = frame['key'].map(index.resolve(frame['key'].unique()))
+
+        missing = frame['pk'].isna()
+        # duplicados contam a partir da 2ª ocorrência, inclusive entre blocos
+        duplicated = ~missing & (frame['key'].duplicated() | frame['key'].isin(seen))
+        not_number = ~missing & frame['quantity'].isna()
+        not_positive = ~missing & ~not_number & ~(frame['quantity'] > 0)
+        seen.update(frame.loc[~missing, 'key'])
+
+        invalid = missing | duplicated | not_number | not_positive
+        for row in frame[invalid].itertuples():
+            if missing[row.Index]:
+                errors.append(f'Linha {row.line}: produto "{row.name}" não encontrado.')
+                continue
+            if duplicated[row.Index]:
+                errors.append(f'Linha {row.line}: produto "{row.name}" duplicado.')
+            if not_number[row.Index]:
+                errors.append(f'Linha {row.line}: quantidade inválida.')
+            elif not_positive[row.Index]:
+                errors.append(f'Linha {row.line}: quantidade deve ser > 0.')
+
+        valid = frame[~invalid]
+        rows.extend(
+            [int(pk), int(qty) if qty % 1 == 0 else float(qty)]
+            for pk, qty in zip(valid['pk'], valid['quantity'])
+        )
+
+    return rows, errors
+
+
+class OrderItemImporter:
+    """
+    Cria OrderItem em uma Order já salva a partir de um DataFrame.
+
+    Uso:
+        importer = OrderItemImporter(order)
+        importer.run(df)                      # arquivo inteiro
+        importer.run_chunks(iter_chunks(f))   # streaming, bloco a bloco
+        importer.created, importer.errors
+
+    Apenas as primeiras MAX_ERRORS mensagens são guardadas; error_count
+    tem o total.
+    """
+
+    def __init__(self, order, on_progress=None):
+        self.order = order
+        self.on_progress = on_progress
+        self.processed = 0
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def run_chunks(self, chunks, skip_rows=0):
+        """
+        Valida e grava cada bloco em sua própria transação. skip_rows pula
+        as primeiras linhas de dados (já gravadas por uma execução anterior).
+        """
+        for chunk in chunks:
+            if skip_rows >= len(chunk):
+                skip_rows -= len(chunk)
+                continue
+            if skip_rows:
+                chunk, skip_rows = chunk.iloc[skip_rows:], 0
+            self.run(chunk)
+        return self
+
+    def run(self, df):
+        # o bloco e o progresso gravado por on_progress são confirmados
+        # juntos: um worker que retoma o job sabe exatamente onde parar
+        with transaction.atomic():
+            self._run(df)
+            self.processed += len(df)
+            if self.on_progress:
+                self.on_progress(self)
+        return self
+
+    def _run(self, df):
+        frame = parse_rows(df)
+        items = resolve_items(frame['key'].unique())
+        frame['item'] = frame['key'].map(items)
+
+        missing = frame['item'].isna()
+        bad_qty = ~missing & ~valid_quantity_mask(frame['quantity'])
+        self._collect_errors(frame, missing, bad_qty)
+
+        valid = frame[~missing & ~bad_qty]
+        if valid.empty:
+            return
+
+        objs = self._build_order_items(valid)
+        with transaction.atomic():
+            OrderItem.objects.bulk_create(objs, batch_size=BULK_BATCH_SIZE)
+        self.created += len(objs)
+
+    def _collect_errors(self, frame, missing, bad_qty):
+        invalid = frame[missing | bad_qty]
+        self.error_count += len(invalid)
+        room = MAX_ERRORS - len(self.errors)
+        for row in invalid.head(max(room, 0)).itertuples():
+            if missing[row.Index]:
+                self.errors.append(f'Linha {row.line}: item "{row.name}" não existe.')
+            else:
+                self.errors.append(f'Linha {row.line}: quantidade inválida.')
+
+    def _build_order_items(self, valid):
+        valid = valid.copy()
+        valid['item_id'] = valid['item'].map(lambda i: i.pk)
+        item_ids = valid['item_id'].unique()
+
+        margins = pricing.customer_margins(self.order.customer_id, item_ids)
+
+        # preços calculados por coluna, em Decimal
+        usd_rmb = self.order.usd_rmb or pricing.ZERO
+        cost_price = valid['item'].map(lambda i: i.cost_price or pricing.ZERO)
+        is_usd = valid['item'].map(lambda i: pricing.is_usd(i.currency))
+        converted = (cost_price * usd_rmb).map(lambda v: v.quantize(pricing.CENT))
+        valid['cost_price'] = cost_price
+        valid['cost_price_usd'] = cost_price.where(is_usd, converted)
+        valid['margin'] = valid['item_id'].map(lambda pk: margins.get(pk, pricing.ZERO))
+        factor = Decimal('1.00') + valid['margin'] / pricing.HUNDRED
+        valid['sale_price'] = (valid['cost_price_usd'] * factor).map(lambda v: v.quantize(pricing.CENT))
+        valid['packaging_version'] = valid['item'].map(lambda i: i.current_packaging_version)
+
+        return [
+            OrderItem(
+                order=self.order,
+                item=row.item,
+                packaging_version=row.packaging_version,
+                quantity=int(row.quantity),
+                cost_price=row.cost_price,
+                cost_price_usd=row.cost_price_usd,
+                margin=row.margin,
+                sale_price=row.sale_price,
+            )
+            for row in valid.itertuples()
+        ]
@@ -0,0 +1,131 @@
+"""
+Fila de importações de itens baseada no banco (sem broker externo).
+
+Vários workers podem rodar em paralelo: cada job é "reivindicado" com um
+UPDATE condicional (status pendente → em execução), então só um worker
+consegue pegar cada job.
+
+O worker grava o progresso (e updated_at) a cada bloco. Um job em execução
+sem progresso há mais de STALE_AFTER é tratado como abandonado (worker
+morto, container reiniciado) e volta a ser reivindicável; quem o pega
+retoma a partir das linhas já processadas.
+
+started_at identifica a reivindicação: toda gravação do worker (progresso e
+resultado final) é um UPDATE condicionado a ele. Se o job foi reivindicado
+por outro worker, o UPDATE não encontra a linha e o primeiro worker para,
+desfazendo o bloco em andamento.
+"""
+from datetime import timedelta
+from django.db.models import Q
+from django.utils import timezone
+from .models import OrderItemImportJob
+from . import importers
+
+
+STALE_AFTER = timedelta(minutes=10)
+
+
+def claimable_jobs():
+    """Jobs pendentes ou em execução sem progresso há mais de STALE_AFTER."""
+    return OrderItemImportJob.objects.filter(
+        Q(status=OrderItemImportJob.STATUS_PENDING)
+        | Q(status=OrderItemImportJob.STATUS_RUNNING,
+            updated_at__lt=timezone.now() - STALE_AFTER)
+    )
+
+
+class ClaimLost(Exception):
+    """O job foi reivindicado por outro worker (este foi dado como morto)."""
+
+
+def claim_next_job():
+    """Reserva o job disponível mais antigo; retorna None se a fila estiver vazia."""
+    while True:
+        pending = claimable_jobs()
+        pk = pending.order_by('created_at', 'pk').values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+        claimed = pending.filter(pk=pk).update(
+            status=OrderItemImportJob.STATUS_RUNNING,
+            started_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        if claimed:
+            return OrderItemImportJob.objects.select_related('order').get(pk=pk)
+        # outro worker pegou este job antes; tenta o próximo
+
+
+def run_job(job):
+    """
+    Processa o arquivo do job em blocos, gravando o progresso a cada bloco.
+    Um job retomado continua depois das linhas que já tinham sido gravadas.
+    Retorna None se o job deixou de ser deste worker no meio do caminho.
+    """
+    claim = OrderItemImportJob.objects.filter(
+        pk=job.pk, status=OrderItemImportJob.STATUS_RUNNING, started_at=job.started_at,
+    )
+
+    def save(**fields):
+        if not claim.update(updated_at=timezone.now(), **fields):
+            raise ClaimLost(job.pk)
+
+    def save_progress(importer):
+        # roda dentro da transação do bloco: perder o job desfaz o bloco
+        save(
+            processed_rows=importer.processed,
+            created_rows=importer.created,
+            error_count=importer.error_count,
+            errors=importer.errors,
+        )
+
+    importer = importers.OrderItemImporter(job.order, on_progress=save_progress)
+    importer.processed = job.processed_rows
+    importer.created = job.created_rows
+    importer.error_count = job.error_count
+    importer.errors = list(job.errors)
+    status = OrderItemImportJob.STATUS_DONE
+    fatal = None
+    try:
+        with job.file.open('rb') as file:
+            job.total_rows = importers.count_rows(file)
+            save(total_rows=job.total_rows)
+            importer.run_chunks(importers.iter_chunks(file), skip_rows=job.processed_rows)
+    except ClaimLost:
+        return None
+    except importers.InvalidColumnsError as e:
+        status, fatal = OrderItemImportJob.STATUS_FAILED, str(e)
+    except importers.READ_ERRORS as e:
+        status, fatal = OrderItemImportJob.STATUS_FAILED, f'Erro ao ler o arquivo: {e}'
+    except Exception as e:
+        status, fatal = OrderItemImportJob.STATUS_FAILED, f'{type(e).__name__}: {e}'
+
+    job.status = status
+    job.processed_rows = importer.processed
+    job.created_rows = importer.created
+    job.error_count = importer.error_count + (1 if fatal else 0)
+    job.errors = importer.errors + ([fatal] if fatal else [])
+    job.finished_at = timezone.now()
+    try:
+        save(
+            status=job.status,
+            processed_rows=job.processed_rows,
+            created_rows=job.created_rows,
+            error_count=job.error_count,
+            errors=job.errors,
+            finished_at=job.finished_at,
+        )
+    except ClaimLost:
+        return None
+    return job
+
+
+def run_pending(limit=None):
+    """Esvazia a fila (ou processa até `limit` jobs). Retorna quantos rodaram."""
+    done = 0
+    while limit is None or done < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
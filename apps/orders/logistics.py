@@ -0,0 +1,188 @@
+"""
+Resumo logístico materializado por lote (BatchLogisticsSummary).
+
+Os totais de caixas master, NW, GW e CBM de cada OrderBatch ficam gravados
+em uma linha própria, recalculada apenas para os lotes afetados quando um
+BatchItem, a embalagem de um OrderItem ou uma ItemPackagingVersion muda
+(ver signals.py). As métricas de lote e de shipment só somam essas linhas.
+
+Views que salvam várias linhas de uma vez (formsets) envolvem o save em
+deferred_refresh(): os signals só anotam os lotes afetados e cada lote é
+recalculado uma única vez ao final do bloco.
+"""
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import BatchItem, BatchLogisticsSummary, OrderBatch
+
+
+ZERO = Decimal('0')
+PLACES = Decimal('0.0001')
+PACKAGING_FIELDS = [
+    'qty_per_master_box', 'package_gross_weight', 'net_weight',
+    'packing_lengh', 'packing_width', 'packing_height',
+]
+SUMMARY_FIELDS = ['box_qty', 'net_weight', 'gross_weight', 'cbm']
+REBUILD_CHUNK_SIZE = 500
+
+_deferred = threading.local()
+
+
+def batch_totals(batch_items):
+    """
+    Calcula {batch_id: {box_qty, net_weight, gross_weight, cbm}} para um
+    queryset de BatchItem em uma única query.
+
+    A embalagem usada é a congelada no OrderItem ou, se não houver, a versão
+    vigente (valid_to nulo) do item. As quantidades são somadas no banco,
+    agrupadas por lote e embalagem; o rateio por caixa é feito aqui em
+    Decimal (no SQLite a divisão em SQL seria inteira).
+    """
+    rows = (
+        batch_items
+            .order_by()
+            .values('batch_id', **{
+                f: Coalesce(
+                    f'order_item__packaging_version__{f}',
+                    f'order_item__item__current_packaging_version__{f}',
+                )
+                for f in PACKAGING_FIELDS
+            })
+            .annotate(qty=Sum('quantity'))
+    )
+
+    totals = {}
+    for row in rows:
+        batch = totals.setdefault(row['batch_id'], dict.fromkeys(SUMMARY_FIELDS, ZERO))
+        qpm = Decimal(row['qty_per_master_box'] or 0)
+        if not qpm:
+            continue
+        masters = Decimal(row['qty']) / qpm
+        batch['box_qty'] += masters
+        batch['gross_weight'] += masters * row['package_gross_weight']
+        batch['net_weight'] += masters * row['net_weight']
+        batch['cbm'] += masters * (
+            row['packing_lengh'] * row['packing_width'] * row['packing_height']
+        )
+    return totals
+
+
+def refresh_batches(batch_ids):
+    """
+    Recalcula e grava o resumo dos lotes informados. Lotes que não existem
+    mais (ex.: BatchItem apagado em cascata junto com o lote) são ignorados.
+    """
+    batch_ids = set(
+        OrderBatch.objects
+            .filter(pk__in=set(batch_ids))
+            .values_list('pk', flat=True)
+    )
+    if not batch_ids:
+        return 0
+
+    totals = batch_totals(BatchItem.objects.filter(batch_id__in=batch_ids))
+    existing = BatchLogisticsSummary.objects.in_bulk(batch_ids)
+
+    to_create, to_update = [], []
+    for batch_id in batch_ids:
+        values = {
+            f: v.quantize(PLACES)
+            for f, v in totals.get(batch_id, dict.fromkeys(SUMMARY_FIELDS, ZERO)).items()
+        }
+        summary = existing.get(batch_id)
+        if summary is None:
+            to_create.append(BatchLogisticsSummary(batch_id=batch_id, **values))
+        elif any(getattr(summary, f) != v for f, v in values.items()):
+            for f, v in values.items():
+                setattr(summary, f, v)
+            summary.updated_at = timezone.now()
+            to_update.append(summary)
+
+    BatchLogisticsSummary.objects.bulk_create(to_create)
+    BatchLogisticsSummary.objects.bulk_update(to_update, SUMMARY_FIELDS + ['updated_at'])
+    return len(batch_ids)
+
+
+def _batches_of_order_items(order_item_ids):
+    return (
+        BatchItem.objects
+            .filter(order_item_id__in=set(order_item_ids))
+            .values_list('batch_id', flat=True)
+            .distinct()
+    )
+
+
+def refresh_for_order_items(order_item_ids):
+    """Recalcula os lotes que contêm algum dos OrderItem informados."""
+    return refresh_batches(_batches_of_order_items(order_item_ids))
+
+
+def refresh_for_item(item_id):
+    """Recalcula os lotes com BatchItem de um Item (mudança de embalagem)."""
+    return refresh_batches(
+        BatchItem.objects
+            .filter(order_item__item_id=item_id)
+            .values_list('batch_id', flat=True)
+            .distinct()
+    )
+
+
+@contextmanager
+def deferred_refresh():
+    """
+    Adia os recálculos pedidos via schedule() até o fim do bloco e faz um
+    único refresh_batches com todos os lotes afetados. Se o bloco levantar
+    exceção nada é recalculado (a transação da view vai ser desfeita).
+    Blocos aninhados são absorvidos pelo mais externo.
+    """
+    if getattr(_deferred, 'pending', None) is not None:
+        yield
+        return
+
+    pending = _deferred.pending = {'batches': set(), 'order_items': set()}
+    try:
+        yield
+    finally:
+        _deferred.pending = None
+
+    batch_ids = set(pending['batches'])
+    if pending['order_items']:
+        batch_ids.update(_batches_of_order_items(pending['order_items']))
+    refresh_batches(batch_ids)
+
+
+def schedule(batch_ids=(), order_item_ids=()):
+    """
+    Pede o recálculo dos lotes informados e dos lotes que contêm os OrderItem
+    informados: na hora, ou no fim do deferred_refresh() em andamento.
+    """
+    pending = getattr(_deferred, 'pending', None)
+    if pending is None:
+        if batch_ids:
+            refresh_batches(batch_ids)
+        if order_item_ids:
+            refresh_for_order_items(order_item_ids)
+        return
+    pending['batches'].update(batch_ids)
+    pending['order_items'].update(order_item_ids)
+
+
+def ensure_summaries(batches):
+    """
+    Garante que os lotes do queryset tenham resumo (lotes criados antes da
+    tabela existir, ou gravados por caminhos que não disparam signals).
+    """
+    return refresh_batches(
+        batches.filter(logistics_summary__isnull=True).values_list('pk', flat=True)
+    )
+
+
+def rebuild_all(chunk_size=REBUILD_CHUNK_SIZE):
+    """Recalcula o resumo de todos os lotes, em blocos."""
+    ids = list(OrderBatch.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), chunk_size):
+        refresh_batches(ids[start:start + chunk_size])
+    return len(ids)
@@ -0,0 +1,104 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from apps.core.models import Customer
+from apps.inventory.models import Item
+from apps.inventory.views import ItemListView
+from apps.orders.views import OrderListView
+
+
+COPIED_FIELDS = ['cost_price', 'selling_price', 'moq']
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede as buscas textuais das listas (Orders por cliente, Itens por "
+        "código/nome) com as tabelas de clientes e itens crescendo até os "
+        "tamanhos informados. As linhas sintéticas são criadas em uma "
+        "transação desfeita no final; os itens copiam as chaves estrangeiras "
+        "de um Item existente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1_000, 10_000, 100_000])
+        parser.add_argument('--term', default='zq7', help='Termo buscado (padrão: sem resultados).')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--explain', action='store_true', help='Mostra o plano de cada busca.')
+
+    def handle(self, *args, **options):
+        template = Item.objects.first()
+        if template is None:
+            raise CommandError("Nenhum Item cadastrado para servir de modelo.")
+
+        with transaction.atomic():
+            self.run(template, options)
+            transaction.set_rollback(True)
+
+    def run(self, template, options):
+        customers = Customer.objects.count()
+        items = Item.objects.count()
+
+        self.stdout.write(f"{'linhas':>10}  {'lista':<8} {'página ms':>10} {'count ms':>10}")
+        for size in sorted(options['sizes']):
+            customers += self.grow_customers(customers, size - customers, options['batch_size'])
+            items += self.grow_items(template, items, size - items, options['batch_size'])
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+            for label, queryset in self.list_querysets(options['term']):
+                page = min(self.timed(lambda: list(queryset[:25])) for _ in range(options['repeat']))
+                count = min(self.timed(queryset.count) for _ in range(options['repeat']))
+                self.stdout.write(f"{size:>10}  {label:<8} {page * 1000:>10.2f} {count * 1000:>10.2f}")
+                if options['explain']:
+                    self.stdout.write(queryset.explain())
+
+    @staticmethod
+    def list_querysets(term):
+        """Querysets montados pelas próprias views, com o filtro de busca."""
+        factory = RequestFactory()
+
+        def view_queryset(view_class, params):
+            view = view_class()
+            view.setup(factory.get('/', params))
+            return view.get_queryset()
+
+        return [
+            ('orders', view_queryset(OrderListView, {'search': term})),
+            ('items', view_queryset(ItemListView, {'q': term})),
+        ]
+
+    @staticmethod
+    def timed(fn):
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
+
+    @staticmethod
+    def grow_customers(offset, count, batch_size):
+        if count <= 0:
+            return 0
+        Customer.objects.bulk_create(
+            (Customer(name=f"Benchmark Customer {n:08d}", email=f"bench{n}@example.com")
+             for n in range(offset, offset + count)),
+            batch_size=batch_size,
+        )
+        return count
+
+    @staticmethod
+    def grow_items(template, offset, count, batch_size):
+        if count <= 0:
+            return 0
+        copied = {
+            f.attname: getattr(template, f.attname)
+            for f in Item._meta.concrete_fields
+            if (f.many_to_one and f.editable) or f.name in COPIED_FIELDS
+        }
+        Item.objects.bulk_create(
+            (Item(p_code=f"BENCH-{n:08d}", s_code=f"B{n:08d}", name=f"Benchmark item {n:08d}", **copied)
+             for n in range(offset, offset + count)),
+            batch_size=batch_size,
+        )
+        return count
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.orders import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Processa as importações de itens pendentes (OrderItemImportJob). "
+        "Sem --loop, esvazia a fila e termina (uso via cron); com --loop, "
+        "fica consultando a fila. Pode haver vários workers em paralelo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Continua consultando a fila.')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Intervalo entre consultas (s).')
+        parser.add_argument('--limit', type=int, default=None, help='Máximo de jobs por execução.')
+
+    def handle(self, *args, **options):
+        while True:
+            done = jobs.run_pending(limit=options['limit'])
+            if done:
+                self.stdout.write(f"{done} importação(ões) processada(s).")
+            if not options['loop']:
+                break
+            if not done:
+                time.sleep(options['sleep'])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from apps.orders import logistics
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula o resumo logístico (BatchLogisticsSummary) dos lotes. "
+        "Sem argumentos, recalcula todos; use após cargas feitas por fora "
+        "dos signals (bulk_create, update em massa, SQL direto)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('batch_ids', nargs='*', type=int, help='Lotes a recalcular (padrão: todos).')
+        parser.add_argument('--chunk-size', type=int, default=logistics.REBUILD_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['batch_ids']:
+            done = logistics.refresh_batches(options['batch_ids'])
+        else:
+            done = logistics.rebuild_all(chunk_size=options['chunk_size'])
+        self.stdout.write(f"{done} lote(s) recalculado(s).")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from apps.orders import dashboard
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói os agregados do dashboard (DashboardAggregate) a partir "
+        "das orders, lotes e resumos logísticos. Feito para rodar pelo cron "
+        "(ver cron.d/agk-core)."
+    )
+
+    def handle(self, *args, **options):
+        rows = dashboard.refresh()
+        self.stdout.write(f"{rows} linha(s) de agregados gravada(s).")
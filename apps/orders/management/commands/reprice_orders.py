@@ -0,0 +1,39 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.formats import number_format
+from apps.orders import pricing
+from apps.orders.models import Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Reprecifica (cost_price_usd / sale_price) os itens das orders abertas "
+        "(não travadas). Com --usd-rmb, grava antes o novo câmbio nessas orders."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('order_ids', nargs='*', type=int, help='Orders a reprecificar (padrão: todas as abertas).')
+        parser.add_argument('--usd-rmb', type=Decimal, default=None, help='Novo câmbio USD → CNY.')
+
+    def handle(self, *args, **options):
+        orders = Order.objects.filter(is_locked=False)
+        if options['order_ids']:
+            orders = orders.filter(pk__in=options['order_ids'])
+
+        usd_rmb = options['usd_rmb']
+        if usd_rmb is not None and usd_rmb < 0:
+            raise CommandError('--usd-rmb não pode ser negativo.')
+
+        with transaction.atomic():
+            if usd_rmb is not None:
+                orders.update(usd_rmb=usd_rmb, updated_at=timezone.now())
+            summary = pricing.reprice_items(OrderItem.objects.filter(order__in=orders))
+
+        fmt = lambda v: number_format(v, decimal_pos=2, force_grouping=True)
+        self.stdout.write(
+            f"{summary['orders']} order(s), {summary['lines']} linha(s), "
+            f"{summary['changed']} alterada(s). Total: {fmt(summary['total_before'])} → "
+            f"{fmt(summary['total_after'])} (Δ {fmt(summary['delta'])})."
+        )
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-17 15:42
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0017_orderitemimportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchLogisticsSummary',
+            fields=[
+                ('batch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='logistics_summary', serialize=False, to='orders.orderbatch')),
+                ('box_qty', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=20)),
+                ('net_weight', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=20)),
+                ('gross_weight', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=20)),
+                ('cbm', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-17 16:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_packaging_version_item_index'),
+        ('orders', '0018_batchlogisticssummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batchitem',
+            index=models.Index(fields=['order_item', 'batch'], name='orders_batchitem_oi_batch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderbatch',
+            index=models.Index(fields=['order', 'created_at', 'id'], name='orders_batch_order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', 'id'], name='orders_orderitem_order_pk_idx'),
+        ),
+        migrations.AlterField(
+            model_name='batchitem',
+            name='order_item',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='orders.orderitem'),
+        ),
+        migrations.AlterField(
+            model_name='orderbatch',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='orders.order'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='orders.order'),
+        ),
+    ]
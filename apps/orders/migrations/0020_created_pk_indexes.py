@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2026-10-17 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_customer_name_search_index'),
+        ('orders', '0019_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'id'], name='orders_order_created_pk_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderbatch',
+            index=models.Index(fields=['created_at', 'id'], name='orders_batch_created_pk_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-17 16:15
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_customer_name_search_index'),
+        ('orders', '0020_created_pk_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('value', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=18)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('box_qty', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=20)),
+                ('cbm', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=20)),
+                ('refreshed_at', models.DateTimeField()),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.company')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.customer')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'customer', 'month', 'status'), name='orders_dashboard_aggregate_unique')],
+            },
+        ),
+    ]
@@ -2,9 +2,11 @@ from decimal import Decimal
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db.models import Sum
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from apps.core.models import Customer, Exporter, Company, Port, SalesRepresentative, BusinessUnit, Project, OrderType
 from apps.inventory.models import Item, ItemPackagingVersion
+from . import pricing
 
 
 class Order(models.Model):
@@ -69,14 +71,7 @@ class Order(models.Model):
          - shipped: total já embarcado (soma de BatchItem.quantity)
          - remaining: quantidade restante (order.quantity - shipped)
         """
-        return (
-            self.order_items
-                .annotate(shipped_qty=Sum('batchitem__quantity'))
-                .annotate(
-                    shipped_qty=models.F('shipped_qty'),
-                    remaining=models.F('quantity') - models.F('shipped_qty')
-                )
-        )
+        return self.order_items.with_balances()
 
     def clean(self):
         super().clean()
@@ -84,13 +79,34 @@ class Order(models.Model):
             raise ValidationError({
                 'required_schedule': 'This field is required when “asap” is false.'
             })
+
+    class Meta:
+        indexes = [
+            # lista de orders paginada por keyset (mais recentes primeiro)
+            models.Index(fields=['created_at', 'id'], name='orders_order_created_pk_idx'),
+        ]
     
     def __str__(self):
         return f"Ordem #{self.pk} - {self.customer.name}"
 
 
+class OrderItemQuerySet(models.QuerySet):
+    def with_balances(self):
+        """
+        Anota shipped (soma de BatchItem.quantity) e remaining em uma única
+        query; shipped_qty / remaining_qty passam a usar esses valores em vez
+        de consultar o banco a cada acesso.
+        """
+        return self.annotate(
+            shipped=Coalesce(Sum('batchitem__quantity'), 0),
+        ).annotate(
+            remaining=models.F('quantity') - models.F('shipped'),
+        )
+
+
 class OrderItem(models.Model):
-    order = models.ForeignKey(Order, related_name='order_items', on_delete=models.CASCADE)
+    # indexado junto com o pk em Meta.indexes
+    order = models.ForeignKey(Order, related_name='order_items', on_delete=models.CASCADE, db_index=False)
     item = models.ForeignKey(Item, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField()
     cost_price = models.DecimalField(
@@ -132,9 +148,13 @@ class OrderItem(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 
+    objects = OrderItemQuerySet.as_manager()
+
     @property
     def shipped_qty(self):
         """Soma todas as quantidades já embarcadas neste OrderItem."""
+        if hasattr(self, 'shipped'):
+            return self.shipped
         shipped = (
             self.batchitem_set
                 .aggregate(total=Sum('quantity'))['total']
@@ -144,6 +164,8 @@ class OrderItem(models.Model):
     @property
     def remaining_qty(self):
         """Quantidade que ainda resta embarcar."""
+        if hasattr(self, 'remaining'):
+            return self.remaining
         return self.quantity - self.shipped_qty
 
     @property
@@ -152,17 +174,11 @@ class OrderItem(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.pk and not self.packaging_version:
-            self.packaging_version = self.item.current_packaging_version()
-            
-        if self.item.currency == 'USD':
-            self.cost_price_usd = self.cost_price or Decimal('0.00')
-        else:
-            usd_rmb = getattr(self.order, 'usd_rmb', Decimal('0.00')) or Decimal('0.00')
-            self.cost_price_usd = (self.cost_price * usd_rmb).quantize(Decimal('0.01')) or Decimal('0.00')
-
-        margin = self.margin if self.margin is not None else Decimal("0.00")
-        factor = Decimal("1.00") + (margin / Decimal("100.00"))
-        self.sale_price = (self.cost_price_usd * factor).quantize(Decimal("0.01"))
+            self.packaging_version_id = self.item.current_packaging_version_id
+
+        usd_rmb = getattr(self.order, 'usd_rmb', Decimal('0.00'))
+        self.cost_price_usd = pricing.to_usd(self.cost_price, self.item.currency, usd_rmb)
+        self.sale_price = pricing.apply_margin(self.cost_price_usd, self.margin)
 
         super().save(*args, **kwargs)
 
@@ -171,8 +187,77 @@ class OrderItem(models.Model):
     
     class Meta:
         ordering = ['pk']
+        indexes = [
+            # itens de uma order, na ordem padrão (formsets, páginas da order)
+            models.Index(fields=['order', 'id'], name='orders_orderitem_order_pk_idx'),
+        ]
     
 
+class OrderItemImportJob(models.Model):
+    """
+    Importação de itens processada fora do request.
+    O arquivo fica salvo em disco e um worker (manage.py process_import_jobs)
+    consome os jobs pendentes, atualizando o progresso a cada bloco.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    order = models.ForeignKey(Order, related_name='import_jobs', on_delete=models.CASCADE)
+    file = models.FileField(upload_to='order_imports/%Y/%m/%d/')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_rows = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Order Item Import"
+        verbose_name_plural = "Order Item Imports"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    def __str__(self):
+        return f"Import #{self.pk} — Ordem #{self.order_id} ({self.get_status_display()})"
+
+
+class OrderBatchQuerySet(models.QuerySet):
+    def with_total_value(self):
+        """
+        Anota total_value = soma(quantity * order_item.sale_price) dos
+        BatchItem de cada lote, o mesmo total_selling_price de
+        get_batch_metrics. Em subquery correlacionada: a query dos lotes
+        não precisa de GROUP BY e o COUNT da listagem não calcula o total.
+        """
+        totals = (
+            BatchItem.objects
+                .filter(batch=OuterRef('pk'))
+                .order_by()
+                .values('batch')
+                .annotate(total=Sum(F('quantity') * F('order_item__sale_price')))
+                .values('total')
+        )
+        money = models.DecimalField(max_digits=14, decimal_places=2)
+        return self.annotate(
+            total_value=Coalesce(Subquery(totals, output_field=money), Value(Decimal('0')), output_field=money),
+        )
+
+
 class OrderBatch(models.Model):
     STATUS_CHOICES = [
         ('negotiation', 'In Negotiation'),
@@ -185,12 +270,21 @@ class OrderBatch(models.Model):
         ('canceled', 'Canceled'),
     ]
 
-    order = models.ForeignKey(Order, related_name='batches', on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, related_name='batches', on_delete=models.CASCADE, db_index=False)
     batch_code = models.CharField(max_length=50)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='created')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderBatchQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # lotes de uma order, mais recentes primeiro
+            models.Index(fields=['order', 'created_at', 'id'], name='orders_batch_order_created_idx'),
+            # lista de todos os lotes paginada por keyset
+            models.Index(fields=['created_at', 'id'], name='orders_batch_created_pk_idx'),
+        ]
 
     def __str__(self):
         return f"Lote {self.batch_code} — {self.get_status_display()}"
@@ -198,13 +292,75 @@ class OrderBatch(models.Model):
 
 class BatchItem(models.Model):
     batch = models.ForeignKey(OrderBatch, related_name='batch_items', on_delete=models.CASCADE)
-    order_item = models.ForeignKey(OrderItem,  on_delete=models.PROTECT)
+    order_item = models.ForeignKey(OrderItem,  on_delete=models.PROTECT, db_index=False)
     quantity = models.PositiveIntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # quantidade já alocada de um OrderItem, fora de um lote
+            # (filter(order_item=...).exclude(batch=...))
+            models.Index(fields=['order_item', 'batch'], name='orders_batchitem_oi_batch_idx'),
+        ]
+
     def __str__(self):
         return f"{self.order_item.item.name} ({self.quantity})"
+
+
+class BatchLogisticsSummary(models.Model):
+    """
+    Totais logísticos de um OrderBatch (caixas master, NW, GW e CBM),
+    mantidos por apps.orders.logistics a cada alteração de BatchItem ou de
+    embalagem. Métricas de lote e de shipment leem daqui em vez de
+    recalcular a partir dos BatchItem.
+    """
+    batch = models.OneToOneField(
+        OrderBatch,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='logistics_summary',
+    )
+    box_qty = models.DecimalField(max_digits=20, decimal_places=4, default=Decimal('0'))
+    net_weight = models.DecimalField(max_digits=20, decimal_places=4, default=Decimal('0'))
+    gross_weight = models.DecimalField(max_digits=20, decimal_places=4, default=Decimal('0'))
+    cbm = models.DecimalField(max_digits=20, decimal_places=4, default=Decimal('0'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Resumo logístico de {self.batch}"
+
+
+class DashboardAggregate(models.Model):
+    """
+    Totais do dashboard (valor, quantidade, caixas master e CBM) por
+    companhia, cliente, mês da order e status. O status é o do lote; o
+    saldo das orders ainda não alocado em lotes fica em STATUS_OPEN, sem
+    caixas/CBM. A tabela é reconstruída por inteiro por
+    apps.orders.dashboard.refresh (manage.py refresh_dashboard, via cron).
+    """
+    STATUS_OPEN = 'open'
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='+')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='+')
+    month = models.DateField()
+    status = models.CharField(max_length=20)
+    value = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0'))
+    quantity = models.BigIntegerField(default=0)
+    box_qty = models.DecimalField(max_digits=20, decimal_places=4, default=Decimal('0'))
+    cbm = models.DecimalField(max_digits=20, decimal_places=4, default=Decimal('0'))
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'customer', 'month', 'status'],
+                name='orders_dashboard_aggregate_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.company} / {self.customer} / {self.month:%Y-%m} / {self.status}"
  
 
 class Stage(models.Model):
@@ -0,0 +1,171 @@
+from decimal import Decimal
+from django.utils import timezone
+from apps.inventory.models import Item
+from apps.pricing import margins
+
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+HUNDRED = Decimal('100.00')
+REPRICE_BATCH_SIZE = 500
+
+
+def is_usd(currency):
+    """Aceita tanto um Currency quanto o nome da moeda."""
+    return str(currency) == 'USD'
+
+
+def to_usd(cost_price, currency, usd_rmb):
+    """Converte o custo para dólar usando o câmbio da order."""
+    cost_price = cost_price or ZERO
+    if is_usd(currency):
+        return cost_price
+    return (cost_price * (usd_rmb or ZERO)).quantize(CENT)
+
+
+def apply_margin(cost_price_usd, margin):
+    """Preço de venda = custo em dólar acrescido da margem (%)."""
+    margin = margin if margin is not None else ZERO
+    factor = Decimal('1.00') + (margin / HUNDRED)
+    return (cost_price_usd * factor).quantize(CENT)
+
+
+def current_packaging_versions(item_ids):
+    """
+    Retorna {item_id: ItemPackagingVersion} com a versão vigente de cada
+    item, em uma única query (via Item.current_packaging_version).
+    """
+    qs = (
+        Item.objects
+            .filter(pk__in=set(item_ids), current_packaging_version__isnull=False)
+            .select_related('current_packaging_version')
+    )
+    return {item.pk: item.current_packaging_version for item in qs}
+
+
+def customer_margins(customer, item_ids, request=None):
+    """
+    Retorna {item_id: margin} das margens padrão do cliente para os itens
+    informados, a partir do mapa em cache do cliente (apps.pricing.margins).
+    """
+    customer_map = margins.margin_map(customer, request)
+    return {pk: customer_map[pk] for pk in set(item_ids) if pk in customer_map}
+
+
+def price_order_items(order, order_items, request=None):
+    """
+    Completa OrderItem novos de uma order (ainda não salvos) com custo,
+    embalagem vigente, margem padrão do cliente e preços, sem salvar.
+
+    São duas queries no total, independente do número de linhas: itens
+    (com moeda e embalagem vigente) e margens do cliente (esta só quando o
+    mapa do cliente não está em cache). Linhas que já trazem margem ou
+    embalagem mantêm o valor informado.
+    """
+    item_ids = {oi.item_id for oi in order_items}
+    items = (
+        Item.objects
+            .select_related('currency', 'current_packaging_version')
+            .in_bulk(item_ids)
+    )
+    default_margins = customer_margins(order.customer_id, item_ids, request)
+
+    for oi in order_items:
+        oi.order = order
+        oi.item = items[oi.item_id]
+        oi.cost_price = oi.item.cost_price or ZERO
+        if oi.packaging_version_id is None:
+            oi.packaging_version = oi.item.current_packaging_version
+        if oi.margin is None:
+            oi.margin = default_margins.get(oi.item_id, ZERO)
+        oi.cost_price_usd = to_usd(oi.cost_price, oi.item.currency, order.usd_rmb)
+        oi.sale_price = apply_margin(oi.cost_price_usd, oi.margin)
+    return order_items
+
+
+def reprice_items(order_items):
+    """
+    Recalcula cost_price_usd e sale_price de um queryset de OrderItem com o
+    câmbio atual de cada order e a margem gravada em cada linha.
+
+    Lê só as colunas necessárias em uma query, calcula em Decimal com as
+    mesmas regras do OrderItem.save e grava apenas as linhas alteradas com
+    bulk_update (um UPDATE por bloco de REPRICE_BATCH_SIZE linhas).
+    Retorna um resumo das diferenças.
+    """
+    from .models import OrderItem  # models importa este módulo
+
+    rows = order_items.order_by().values_list(
+        'pk', 'order_id', 'order__usd_rmb', 'item__currency__name',
+        'cost_price', 'cost_price_usd', 'margin', 'sale_price', 'quantity',
+    )
+
+    now = timezone.now()
+    changed, orders, lines = [], set(), 0
+    total_before = total_after = ZERO
+    for pk, order_id, usd_rmb, currency, cost, old_usd, margin, old_sale, qty in rows:
+        orders.add(order_id)
+        lines += 1
+        new_usd = to_usd(cost, currency, usd_rmb)
+        new_sale = apply_margin(new_usd, margin)
+        total_before += old_sale * qty
+        total_after += new_sale * qty
+        if new_usd != old_usd or new_sale != old_sale:
+            changed.append(OrderItem(
+                pk=pk, cost_price_usd=new_usd, sale_price=new_sale, updated_at=now,
+            ))
+
+    OrderItem.objects.bulk_update(
+        changed, ['cost_price_usd', 'sale_price', 'updated_at'],
+        batch_size=REPRICE_BATCH_SIZE,
+    )
+    return {
+        'orders': len(orders),
+        'lines': lines,
+        'changed': len(changed),
+        'total_before': total_before,
+        'total_after': total_after,
+        'delta': total_after - total_before,
+    }
+
+
+def reprice_order(order):
+    """Reprecifica todas as linhas de uma order (ex.: após mudar usd_rmb)."""
+    return reprice_items(order.order_items.all())
+
+
+def apply_default_margins(order, request=None):
+    """
+    Aplica a margem padrão do cliente às linhas da order sem margem e
+    recalcula os preços delas (cost_price_usd com o câmbio atual da order,
+    como no OrderItem.save, e sale_price). Uma query lê as linhas, as
+    margens vêm do mapa em cache do cliente e um único UPDATE em lote grava
+    margin e preços juntos. Retorna quantas linhas foram atualizadas.
+    """
+    from .models import OrderItem  # models importa este módulo
+
+    default_margins = margins.margin_map(order.customer_id, request)
+    if not default_margins:
+        return 0
+    rows = (
+        order.order_items
+            .filter(margin__isnull=True)
+            .values_list('pk', 'item_id', 'order__usd_rmb', 'item__currency__name', 'cost_price')
+    )
+
+    now = timezone.now()
+    updated = []
+    for pk, item_id, usd_rmb, currency, cost in rows:
+        if item_id not in default_margins:
+            continue
+        cost_price_usd = to_usd(cost, currency, usd_rmb)
+        updated.append(OrderItem(
+            pk=pk, margin=default_margins[item_id], cost_price_usd=cost_price_usd,
+            sale_price=apply_margin(cost_price_usd, default_margins[item_id]),
+            updated_at=now,
+        ))
+    OrderItem.objects.bulk_update(
+        updated, ['margin', 'cost_price_usd', 'sale_price', 'updated_at'],
+        batch_size=REPRICE_BATCH_SIZE,
+    )
+    return len(updated)
@@ -0,0 +1,30 @@
+"""
+Mantém o BatchLogisticsSummary em dia: cada alteração de BatchItem, da
+embalagem de um OrderItem ou de ItemPackagingVersion recalcula só os lotes
+afetados (uma vez por bloco logistics.deferred_refresh()).
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.inventory.models import ItemPackagingVersion
+from .models import BatchItem, OrderItem
+from . import logistics
+
+
+@receiver(post_save, sender=BatchItem)
+@receiver(post_delete, sender=BatchItem)
+def refresh_batch_summary(sender, instance, **kwargs):
+    logistics.schedule(batch_ids=[instance.batch_id])
+
+
+@receiver(post_save, sender=OrderItem)
+def refresh_order_item_batch_summaries(sender, instance, created, **kwargs):
+    # item novo ainda não está em lote; exclusão apaga os BatchItem em
+    # cascata e quem recalcula é o receiver acima
+    if not created:
+        logistics.schedule(order_item_ids=[instance.pk])
+
+
+@receiver(post_save, sender=ItemPackagingVersion)
+@receiver(post_delete, sender=ItemPackagingVersion)
+def refresh_item_batch_summaries(sender, instance, **kwargs):
+    logistics.refresh_for_item(instance.item_id)
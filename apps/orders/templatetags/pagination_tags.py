@@ -1,13 +1,18 @@
 from django import template
+from agk_core import pagination
 
 register = template.Library()
 
 @register.inclusion_tag('components/_pagination.html', takes_context=True)
-def render_pagination(context, page_obj, param='page'):
+def render_pagination(context, page_obj, param=None):
     """
     Usage: {% render_pagination items_page %}
     Você pode customizar o nome do parâmetro: {% render_pagination items_page 'p' %}
+    Páginas por keyset (agk_core.pagination) usam ?cursor= por padrão e
+    mostram só Primeira / Anterior / Próxima.
     """
+    if param is None:
+        param = pagination.CURSOR_PARAM if getattr(page_obj, 'is_keyset', False) else 'page'
     request = context['request']
     params = request.GET.copy()
     params.pop(param, None)
@@ -1,15 +1,39 @@
+import io
+import shutil
+import tempfile
 from decimal import Decimal
+from unittest import mock
+import pandas as pd
+from openpyxl import Workbook
 from django.utils import timezone
-from django.test import TestCase
+from django.db import IntegrityError, connection, transaction
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.test.utils import CaptureQueriesContext
 
 # Create your tests here.
+from agk_core import metrics
 from apps.core import models as core_models
 from apps.inventory import models as inv_models
 from apps.orders import models as order_models
+from apps.orders import importers, jobs, logistics, pricing
+from apps.orders.forms import BatchItemFormSet, order_item_formset_factory
+from apps.pricing import models as pricing_models
 
 
-class PackagingVersionTest(TestCase):
+# cache em memória nos testes que contam queries: o DatabaseCache das
+# settings também consulta o banco a cada leitura/escrita
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class OrderFixtureMixin:
     def setUp(self):
+        # o cache de margens sobrevive ao rollback do banco entre testes
+        cache.clear()
         city = core_models.City.objects.create(name='C')
         province = core_models.Province.objects.create(name='P')
         self.supplier = core_models.Supplier.objects.create(
@@ -30,21 +54,19 @@ class PackagingVersionTest(TestCase):
             p_code='P1', s_code='S1', cost_price=Decimal('1'), selling_price=Decimal('2'),
             currency=self.currency, name='Item', supplier=self.supplier, category=self.category,
             subcategory=self.subcategory, project=self.inv_project, supplier_chain=self.supplier_chain,
-            brand_manufacturer=self.brand, chain=self.chain, ncm=self.ncm,
-            net_weight=Decimal('1'), package_gross_weight=Decimal('1.1'),
-            packing_lengh=Decimal('10'), packing_width=Decimal('20'), packing_height=Decimal('30'),
-            individual_packing_size=Decimal('1'), individual_packing_type='Box', moq=1
+            brand_manufacturer=self.brand, chain=self.chain, ncm=self.ncm, moq=1
         )
 
         self.pkg1 = inv_models.ItemPackagingVersion.objects.create(
             item=self.item,
-            net_weight=self.item.net_weight,
-            package_gross_weight=self.item.package_gross_weight,
-            packing_lengh=self.item.packing_lengh,
-            packing_width=self.item.packing_width,
-            packing_height=self.item.packing_height,
-            individual_packing_size=self.item.individual_packing_size,
-            individual_packing_type=self.item.individual_packing_type,
+            net_weight=Decimal('1'),
+            package_gross_weight=Decimal('1.1'),
+            packing_lengh=Decimal('10'),
+            packing_width=Decimal('20'),
+            packing_height=Decimal('30'),
+            individual_packing_size=Decimal('1'),
+            individual_packing_type='Box',
+            qty_per_master_box=10,
             valid_from=timezone.now(),
         )
 
@@ -76,6 +98,9 @@ class PackagingVersionTest(TestCase):
             order_type=self.order_type,
         )
 
+
+
+class PackagingVersionTest(OrderFixtureMixin, TestCase):
     def test_order_items_keep_packaging_versions(self):
         order1 = self._create_order()
         oi1 = order_models.OrderItem.objects.create(order=order1, item=self.item, quantity=1)
@@ -92,6 +117,7 @@ class PackagingVersionTest(TestCase):
             packing_height=Decimal('31'),
             individual_packing_size=Decimal('2'),
             individual_packing_type='Crate',
+            qty_per_master_box=20,
             valid_from=timezone.now(),
         )
 
@@ -100,4 +126,937 @@ class PackagingVersionTest(TestCase):
         self.assertEqual(oi2.packaging_version, pkg2)
         # ensure first order item kept original
         oi1.refresh_from_db()
-        self.assertEqual(oi1.packaging_version, self.pkg1)
\ No newline at end of file
+        self.assertEqual(oi1.packaging_version, self.pkg1)
+
+    def test_item_points_to_current_packaging_version(self):
+        item = inv_models.Item.objects.get(pk=self.item.pk)
+        self.assertEqual(item.current_packaging_version_id, self.pkg1.pk)
+
+        pkg2 = inv_models.ItemPackagingVersion.objects.create(
+            item=self.item,
+            net_weight=Decimal('2'),
+            package_gross_weight=Decimal('2.2'),
+            packing_lengh=Decimal('11'),
+            packing_width=Decimal('21'),
+            packing_height=Decimal('31'),
+            individual_packing_size=Decimal('2'),
+            individual_packing_type='Crate',
+            qty_per_master_box=20,
+            valid_from=timezone.now(),
+        )
+        self.pkg1.refresh_from_db()
+        self.assertIsNotNone(self.pkg1.valid_to)
+        item.refresh_from_db()
+        self.assertEqual(item.current_packaging_version_id, pkg2.pk)
+
+        # um Item carregado antes da troca não sobrescreve o ponteiro
+        stale = inv_models.Item.objects.get(pk=self.item.pk)
+        stale.current_packaging_version = self.pkg1
+        stale.save()
+        item.refresh_from_db()
+        self.assertEqual(item.current_packaging_version_id, pkg2.pk)
+
+        pkg2.delete()
+        item.refresh_from_db()
+        self.assertIsNone(item.current_packaging_version_id)
+
+    def test_only_one_open_packaging_version_per_item(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            inv_models.ItemPackagingVersion.objects.bulk_create([
+                inv_models.ItemPackagingVersion(
+                    item=self.item,
+                    net_weight=Decimal('1'),
+                    package_gross_weight=Decimal('1.1'),
+                    packing_lengh=Decimal('10'),
+                    packing_width=Decimal('20'),
+                    packing_height=Decimal('30'),
+                    individual_packing_size=Decimal('1'),
+                    individual_packing_type='Box',
+                    qty_per_master_box=10,
+                    valid_from=timezone.now(),
+                )
+            ])
+
+
+class OrderItemImporterTest(OrderFixtureMixin, TestCase):
+    def _import(self, order, rows):
+        df = pd.DataFrame(rows)
+        self.assertTrue(importers.normalize_columns(df))
+        return importers.OrderItemImporter(order).run(df)
+
+    def test_import_creates_items_and_reports_errors(self):
+        pricing_models.CustomerItemMargin.objects.create(
+            customer=self.customer, item=self.item, margin=Decimal('50')
+        )
+        order = self._create_order()
+        importer = self._import(order, {
+            ' Item ': ['item', 'Nope', 'ITEM', 'Item'],
+            'Quantity': [5, 1, 0, 'x'],
+        })
+
+        self.assertEqual(importer.created, 1)
+        self.assertEqual(importer.errors, [
+            'Linha 2: item "Nope" não existe.',
+            'Linha 3: quantidade inválida.',
+            'Linha 4: quantidade inválida.',
+        ])
+        oi = order.order_items.get()
+        self.assertEqual(oi.quantity, 5)
+        self.assertEqual(oi.packaging_version, self.pkg1)
+        self.assertEqual(oi.margin, Decimal('50.00'))
+        self.assertEqual(oi.cost_price_usd, Decimal('1.00'))
+        self.assertEqual(oi.sale_price, Decimal('1.50'))
+
+    def test_query_count_does_not_grow_with_rows(self):
+        order = self._create_order()
+        with CaptureQueriesContext(connection) as small:
+            self._import(order, {'item': ['Item'] * 2, 'quantity': [1] * 2})
+        cache.clear()  # mesmas condições: mapa de margens frio nas duas rodadas
+        with CaptureQueriesContext(connection) as large:
+            self._import(order, {'item': ['Item'] * 60, 'quantity': [1] * 60})
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(order.order_items.count(), 62)
+
+    def test_streaming_import_reports_progress_per_chunk(self):
+        wb = Workbook()
+        ws = wb.active
+        ws.append(['Item', 'Quantity'])
+        for qty in (1, 2, 3, 4, 5):
+            ws.append(['Item', qty])
+        ws.append(['Nope', 1])
+        buf = io.BytesIO()
+        wb.save(buf)
+        upload = SimpleUploadedFile('items.xlsx', buf.getvalue())
+
+        order = self._create_order()
+        progress = []
+        importer = importers.OrderItemImporter(
+            order, on_progress=lambda imp: progress.append((imp.processed, imp.created))
+        )
+        importer.run_chunks(importers.iter_chunks(upload, chunk_size=2))
+
+        self.assertEqual(progress, [(2, 2), (4, 4), (6, 5)])
+        self.assertEqual(importer.errors, ['Linha 6: item "Nope" não existe.'])
+        self.assertEqual(order.order_items.count(), 5)
+
+    def test_csv_chunks_keep_file_line_numbers(self):
+        upload = SimpleUploadedFile('items.csv', b'item,quantity\nItem,1\nItem,0\nItem,3\n')
+        chunks = list(importers.iter_chunks(upload, chunk_size=2))
+        self.assertEqual([list(c.index + 1) for c in chunks], [[1, 2], [3]])
+
+    def test_missing_columns_raise(self):
+        upload = SimpleUploadedFile('items.csv', b'product,qty\nItem,1\n')
+        with self.assertRaises(importers.InvalidColumnsError):
+            list(importers.iter_chunks(upload))
+
+
+class NewOrderItemsValidationTest(OrderFixtureMixin, TestCase):
+    def test_single_pass_returns_pks_and_errors(self):
+        upload = SimpleUploadedFile(
+            'items.csv', b'item,quantity\nitem,2\nNope,1\nITEM,0\nItem,x\n'
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            rows, errors = importers.validate_new_order_items(
+                importers.iter_chunks(upload, chunk_size=2)
+            )
+        # o índice consulta cada nome uma vez só, mesmo em blocos diferentes
+        self.assertEqual(len(ctx), 1)
+        self.assertEqual(rows, [[self.item.pk, 2]])
+        self.assertEqual(errors, [
+            'Linha 2: produto "Nope" não encontrado.',
+            'Linha 3: produto "ITEM" duplicado.',
+            'Linha 3: quantidade deve ser > 0.',
+            'Linha 4: produto "Item" duplicado.',
+            'Linha 4: quantidade inválida.',
+        ])
+
+
+class OrderItemImportJobTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, ALLOWED_HOSTS=['testserver'])
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_upload_is_queued_and_processed_by_worker(self):
+        order = self._create_order()
+        upload = SimpleUploadedFile('items.csv', b'item,quantity\nItem,2\nNope,1\n')
+        resp = self.client.post(
+            reverse('orders:order-item-import', args=[order.pk]), {'file': upload}
+        )
+        job = order.import_jobs.get()
+        self.assertRedirects(
+            resp, reverse('orders:order-item-import', args=[order.pk]) + f'?job={job.pk}'
+        )
+        self.assertEqual(job.status, order_models.OrderItemImportJob.STATUS_PENDING)
+        self.assertFalse(order.order_items.exists())
+
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertIsNone(jobs.claim_next_job())
+
+        status_url = reverse('orders:order-item-import-status', args=[order.pk, job.pk])
+        page = self.client.get(resp['Location'])
+        self.assertContains(page, f'data-status-url="{status_url}"')
+        data = self.client.get(status_url).json()
+        self.assertEqual(data['status'], 'done')
+        self.assertTrue(data['finished'])
+        self.assertEqual(data['total_rows'], 2)
+        self.assertEqual(data['processed_rows'], 2)
+        self.assertEqual(data['created_rows'], 1)
+        self.assertEqual(data['errors'], ['Linha 2: item "Nope" não existe.'])
+        self.assertEqual(order.order_items.count(), 1)
+
+    def test_stale_running_job_is_reclaimed_and_resumed(self):
+        order = self._create_order()
+        job = order_models.OrderItemImportJob.objects.create(
+            order=order, file=SimpleUploadedFile('items.csv', b'item,quantity\nItem,2\nNope,1\nItem,3\n')
+        )
+        # worker morreu depois de gravar a 1ª linha
+        order_models.OrderItem.objects.create(order=order, item=self.item, quantity=2)
+        Job = order_models.OrderItemImportJob
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.STATUS_RUNNING, processed_rows=1, created_rows=1,
+            updated_at=timezone.now() - jobs.STALE_AFTER / 2,
+        )
+        self.assertIsNone(jobs.claim_next_job())  # ainda pode estar vivo
+
+        Job.objects.filter(pk=job.pk).update(updated_at=timezone.now() - jobs.STALE_AFTER * 2)
+        self.assertEqual(jobs.run_pending(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertEqual((job.processed_rows, job.created_rows, job.error_count), (3, 2, 1))
+        self.assertEqual(job.errors, ['Linha 2: item "Nope" não existe.'])
+        self.assertEqual(sorted(order.order_items.values_list('quantity', flat=True)), [2, 3])
+
+    def test_worker_stops_when_job_is_reclaimed(self):
+        order = self._create_order()
+        Job = order_models.OrderItemImportJob
+        job = Job.objects.create(
+            order=order, file=SimpleUploadedFile('items.csv', b'item,quantity\nItem,2\n')
+        )
+        slow = jobs.claim_next_job()
+        Job.objects.filter(pk=job.pk).update(updated_at=timezone.now() - jobs.STALE_AFTER * 2)
+        other = jobs.claim_next_job()
+        self.assertNotEqual(other.started_at, slow.started_at)
+
+        # o primeiro worker não grava nada: nem o bloco, nem o resultado
+        self.assertIsNone(jobs.run_job(slow))
+        self.assertFalse(order.order_items.exists())
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.STATUS_RUNNING)
+
+        jobs.run_job(other)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.created_rows), (Job.STATUS_DONE, 1))
+        self.assertEqual(order.order_items.count(), 1)
+
+    def test_unexpected_error_keeps_its_message(self):
+        order = self._create_order()
+        order_models.OrderItemImportJob.objects.create(
+            order=order, file=SimpleUploadedFile('items.csv', b'item,quantity\nItem,2\n')
+        )
+        with mock.patch.object(importers.OrderItemImporter, '_run', side_effect=IntegrityError('boom')):
+            job = jobs.run_job(jobs.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, order_models.OrderItemImportJob.STATUS_FAILED)
+        self.assertEqual(job.errors, ['IntegrityError: boom'])
+
+    def test_invalid_header_fails_job(self):
+        order = self._create_order()
+        job = order_models.OrderItemImportJob.objects.create(
+            order=order, file=SimpleUploadedFile('items.csv', b'product,qty\nItem,1\n')
+        )
+        jobs.run_job(jobs.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, order_models.OrderItemImportJob.STATUS_FAILED)
+        self.assertEqual(len(job.errors), 1)
+
+
+class OrderMetricsTest(OrderFixtureMixin, TestCase):
+    def test_order_metrics_aggregate_in_one_query(self):
+        order = self._create_order()
+        order.down_payment = Decimal('30')
+        order.save()
+        order_models.OrderItem.objects.create(
+            order=order, item=self.item, quantity=1000, cost_price=Decimal('2.50'), margin=Decimal('100')
+        )
+        order_models.OrderItem.objects.create(
+            order=order, item=self.item, quantity=3, cost_price=Decimal('1.00')
+        )
+
+        with self.assertNumQueries(2):
+            data = metrics.get_order_metrics(order.pk)
+
+        self.assertEqual(data, {
+            'total_cost_price': '2,503.00',
+            'total_selling_price': '5,003.00',
+            'total_quantity': 1003,
+            'total_profit': '2,500.00',
+            'deposit_payment': '1,500.90',
+        })
+
+    def test_order_metrics_without_items(self):
+        data = metrics.get_order_metrics(self._create_order().pk)
+        self.assertEqual(data['total_selling_price'], '0.00')
+        self.assertEqual(data['total_quantity'], 0)
+
+    def test_batch_list_total_matches_batch_metrics(self):
+        order = self._create_order()
+        line = order_models.OrderItem.objects.create(
+            order=order, item=self.item, quantity=10, cost_price=Decimal('2.50'), margin=Decimal('100')
+        )
+        batch = order_models.OrderBatch.objects.create(order=order, batch_code='B1')
+        order_models.BatchItem.objects.create(batch=batch, order_item=line, quantity=4)
+        empty = order_models.OrderBatch.objects.create(order=order, batch_code='B2')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('orders:batch-list'))
+        totals = {b.pk: b.total_value for b in response.context['batches']}
+
+        # sale_price (5.00), não o selling_price do cadastro do item
+        self.assertEqual(totals, {batch.pk: Decimal('20.00'), empty.pk: Decimal('0')})
+        self.assertEqual(metrics.get_batch_metrics(batch.pk)['total_selling_price'], '20.00')
+        batch_sql = [q['sql'] for q in queries if 'FROM "orders_orderbatch"' in q['sql']]
+        self.assertEqual(len(batch_sql), 2)  # página + contagem estimada
+        self.assertFalse(any('GROUP BY "orders_orderbatch"' in sql for sql in batch_sql))
+
+
+class BatchLogisticsSummaryTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self._create_order()
+        self.order_item = order_models.OrderItem.objects.create(order=self.order, item=self.item, quantity=100)
+        self.batch = order_models.OrderBatch.objects.create(order=self.order, batch_code='L1')
+
+    def _summary(self):
+        return order_models.BatchLogisticsSummary.objects.get(batch=self.batch)
+
+    def test_summary_follows_batch_items(self):
+        bi = order_models.BatchItem.objects.create(batch=self.batch, order_item=self.order_item, quantity=25)
+        summary = self._summary()
+        self.assertEqual(summary.box_qty, Decimal('2.5'))
+        self.assertEqual(summary.gross_weight, Decimal('2.75'))
+        self.assertEqual(summary.cbm, Decimal('15000'))
+        self.assertEqual(metrics.get_batch_metrics(self.batch.pk)['total_box_qty'], '2.50')
+
+        bi.quantity = 40
+        bi.save()
+        self.assertEqual(self._summary().box_qty, Decimal('4'))
+
+        bi.delete()
+        self.assertEqual(self._summary().box_qty, Decimal('0'))
+
+    def test_new_packaging_version_updates_items_without_frozen_packaging(self):
+        order_models.OrderItem.objects.filter(pk=self.order_item.pk).update(packaging_version=None)
+        order_models.BatchItem.objects.create(batch=self.batch, order_item=self.order_item, quantity=40)
+        self.assertEqual(self._summary().box_qty, Decimal('4'))
+
+        inv_models.ItemPackagingVersion.objects.create(
+            item=self.item, net_weight=Decimal('1'), package_gross_weight=Decimal('1'),
+            packing_lengh=Decimal('1'), packing_width=Decimal('1'), packing_height=Decimal('1'),
+            individual_packing_size=Decimal('1'), individual_packing_type='Box',
+            qty_per_master_box=20, valid_from=timezone.now(),
+        )
+        self.assertEqual(self._summary().box_qty, Decimal('2'))
+
+    def test_order_item_packaging_change_refreshes_summary(self):
+        order_models.BatchItem.objects.create(batch=self.batch, order_item=self.order_item, quantity=40)
+        self.assertEqual(self._summary().box_qty, Decimal('4'))
+
+        version = inv_models.ItemPackagingVersion.objects.create(
+            item=self.item, net_weight=Decimal('1'), package_gross_weight=Decimal('1'),
+            packing_lengh=Decimal('1'), packing_width=Decimal('1'), packing_height=Decimal('1'),
+            individual_packing_size=Decimal('1'), individual_packing_type='Box',
+            qty_per_master_box=20, valid_from=timezone.now(),
+        )
+        # embalagem congelada no OrderItem: nova versão do item não muda nada
+        self.assertEqual(self._summary().box_qty, Decimal('4'))
+
+        self.order_item.packaging_version = version
+        self.order_item.save()
+        self.assertEqual(self._summary().box_qty, Decimal('2'))
+
+    def test_deferred_refresh_recomputes_each_batch_once(self):
+        with mock.patch.object(logistics, 'refresh_batches', wraps=logistics.refresh_batches) as refresh:
+            with logistics.deferred_refresh():
+                for qty in (10, 20, 30):
+                    order_models.BatchItem.objects.create(
+                        batch=self.batch, order_item=self.order_item, quantity=qty,
+                    )
+                self.order_item.save()
+                self.assertFalse(order_models.BatchLogisticsSummary.objects.exists())
+        refresh.assert_called_once()
+        self.assertEqual(self._summary().box_qty, Decimal('6'))
+
+    def test_rebuild_command_fills_missing_summaries(self):
+        order_models.BatchItem.objects.bulk_create([
+            order_models.BatchItem(batch=self.batch, order_item=self.order_item, quantity=30),
+        ])
+        self.assertFalse(order_models.BatchLogisticsSummary.objects.exists())
+
+        call_command('rebuild_batch_summaries', stdout=io.StringIO())
+        self.assertEqual(self._summary().box_qty, Decimal('3'))
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class OrderItemBalancesTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self._create_order()
+        self.batch = order_models.OrderBatch.objects.create(order=self.order, batch_code='L1')
+
+    def _add_item(self, quantity, shipped=()):
+        oi = order_models.OrderItem.objects.create(order=self.order, item=self.item, quantity=quantity)
+        for qty in shipped:
+            order_models.BatchItem.objects.create(batch=self.batch, order_item=oi, quantity=qty)
+        return oi
+
+    def test_with_balances_annotates_without_extra_queries(self):
+        a = self._add_item(10, shipped=[3, 4])
+        b = self._add_item(5)
+
+        with self.assertNumQueries(1):
+            items = {oi.pk: oi for oi in self.order.order_items.with_balances().select_related('item')}
+            balances = {pk: (oi.shipped_qty, oi.remaining_qty, str(oi)) for pk, oi in items.items()}
+
+        self.assertEqual(balances[a.pk], (7, 3, 'Item (3)'))
+        self.assertEqual(balances[b.pk], (0, 5, 'Item (5)'))
+        # sem anotação, continua consultando o banco
+        self.assertEqual(order_models.OrderItem.objects.get(pk=a.pk).remaining_qty, 3)
+
+    def test_batch_detail_queries_do_not_grow_with_order_items(self):
+        url = reverse('orders:batch-detail', args=[self.order.pk, self.batch.pk])
+        self._add_item(10, shipped=[1])
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        for _ in range(10):
+            self._add_item(10)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        # o select só traz o item já escolhido; os demais vêm do autocomplete
+        self.assertContains(response, 'Item (9)')
+        self.assertNotContains(response, 'Item (10)')
+        self.assertEqual(len(few), len(many))
+
+    def test_batch_formset_evaluates_order_item_choices_once(self):
+        url = reverse('orders:batch-detail', args=[self.order.pk, self.batch.pk])
+        self._add_item(10, shipped=[1])
+        with CaptureQueriesContext(connection) as one_form:
+            self.client.get(url)
+
+        for _ in range(10):
+            self._add_item(10, shipped=[1])
+        with CaptureQueriesContext(connection) as many_forms:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['items_fs'].forms), 12)
+        self.assertEqual(len(one_form), len(many_forms))
+
+    def test_batch_create_page_autocompletes_order_items(self):
+        self._add_item(10, shipped=[4])
+        self._add_item(5, shipped=[5])  # sem saldo
+        url = reverse('orders:order-item-autocomplete', args=[self.order.pk])
+        response = self.client.get(reverse('orders:batch-add', args=[self.order.pk]))
+        self.assertContains(response, f'data-autocomplete-url="{url}"')
+
+        results = self.client.get(url, {'q': 'ite'}).json()['results']
+        self.assertEqual([r['text'] for r in results], ['Item (6)'])
+        self.assertEqual(self.client.get(url, {'q': 'p1'}).json()['results'], results)
+        self.assertEqual(self.client.get(url, {'q': 'i'}).json()['results'], [])
+
+
+class BatchItemFormSetCleanTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self._create_order()
+        self.batch = order_models.OrderBatch.objects.create(order=self.order, batch_code='L1')
+        self.other = order_models.OrderBatch.objects.create(order=self.order, batch_code='L2')
+        self.items = [
+            order_models.OrderItem.objects.create(order=self.order, item=self.item, quantity=10)
+            for _ in range(5)
+        ]
+        for oi in self.items:
+            order_models.BatchItem.objects.create(batch=self.other, order_item=oi, quantity=6)
+
+    def _formset(self, rows):
+        data = {
+            'batch_item-TOTAL_FORMS': str(len(rows)),
+            'batch_item-INITIAL_FORMS': '0',
+            'batch_item-MIN_NUM_FORMS': '0',
+            'batch_item-MAX_NUM_FORMS': '1000',
+        }
+        for i, (oi, qty) in enumerate(rows):
+            data[f'batch_item-{i}-order_item'] = str(oi.pk)
+            data[f'batch_item-{i}-quantity'] = str(qty)
+        return BatchItemFormSet(data, instance=self.batch, prefix='batch_item')
+
+    def test_shipped_in_other_batches_is_summed_in_one_grouped_query(self):
+        ok = self._formset([(oi, 4) for oi in self.items])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(ok.is_valid())
+        # 1 query por form (to_python do order_item) + trava + soma agrupada
+        # antes: uma agregação por OrderItem; agora uma só, agrupada
+        batch_item_queries = [q for q in ctx.captured_queries if 'FROM "orders_batchitem"' in q['sql']]
+        self.assertEqual(len(batch_item_queries), 1)
+        self.assertIn('GROUP BY', batch_item_queries[0]['sql'])
+
+        too_much = self._formset([(self.items[0], 3), (self.items[0], 2), (self.items[1], 4)])
+        self.assertFalse(too_much.is_valid())
+        self.assertIn('só podem ser enviados 4', too_much.forms[0].errors['quantity'][0])
+        self.assertFalse(too_much.forms[2].errors)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], CACHES=LOCMEM_CACHES)
+class OrderCreatePricingTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.rmb = core_models.Currency.objects.create(name='RMB')
+        self.items = [self.item]
+        for i in range(2, 5):
+            item = inv_models.Item.objects.get(pk=self.item.pk)
+            item.pk, item.p_code, item.name = None, f'P{i}', f'Item {i}'
+            item.cost_price, item.currency = Decimal(f'{i}0.00'), self.rmb
+            item.save()
+            self.items.append(item)
+        pricing_models.CustomerItemMargin.objects.create(
+            customer=self.customer, item=self.items[1], margin=Decimal('50')
+        )
+
+    def test_price_order_items_uses_two_queries(self):
+        order = self._create_order()
+        order.usd_rmb = Decimal('0.14')
+        rows = [order_models.OrderItem(item_id=item.pk, quantity=2) for item in self.items]
+        rows[2].margin = Decimal('10')
+
+        with self.assertNumQueries(2):
+            pricing.price_order_items(order, rows)
+
+        self.assertEqual([oi.cost_price_usd for oi in rows],
+                         [Decimal('1'), Decimal('2.80'), Decimal('4.20'), Decimal('5.60')])
+        self.assertEqual([oi.margin for oi in rows],
+                         [Decimal('0.00'), Decimal('50.00'), Decimal('10'), Decimal('0.00')])
+        self.assertEqual([oi.sale_price for oi in rows],
+                         [Decimal('1.00'), Decimal('4.20'), Decimal('4.62'), Decimal('5.60')])
+        self.assertEqual(rows[0].packaging_version, self.pkg1)
+
+    def test_create_view_bulk_creates_priced_items(self):
+        data = {
+            'customer': self.customer.pk, 'exporter': self.exporter.pk,
+            'company': self.exporter.company.pk, 'validity': '2030-01-01',
+            'usd_rmb': '0.14', 'usd_brl': '5', 'required_schedule': '2030-01-01',
+            'asap': 'on', 'down_payment': '0', 'pol': self.port.pk, 'pod': self.port.pk,
+            'sales_representative': self.rep.pk, 'business_unit': self.business_unit.pk,
+            'project': self.core_project.pk, 'order_type': self.order_type.pk,
+            'orderitems-TOTAL_FORMS': str(len(self.items)), 'orderitems-INITIAL_FORMS': '0',
+            'orderitems-MIN_NUM_FORMS': '0', 'orderitems-MAX_NUM_FORMS': '1000',
+        }
+        for i, item in enumerate(self.items):
+            data[f'orderitems-{i}-item'] = str(item.pk)
+            data[f'orderitems-{i}-quantity'] = '3'
+
+        response = self.client.post(reverse('orders:order-add'), data)
+
+        self.assertEqual(response.status_code, 302)
+        order = order_models.Order.objects.get()
+        sale_prices = list(order.order_items.values_list('sale_price', flat=True))
+        self.assertEqual(sale_prices, [Decimal('1.00'), Decimal('4.20'), Decimal('4.20'), Decimal('5.60')])
+
+    def test_invalid_create_post_keeps_items_page(self):
+        data = {
+            'orderitems-TOTAL_FORMS': '7', 'orderitems-INITIAL_FORMS': '0',
+            'orderitems-MIN_NUM_FORMS': '0', 'orderitems-MAX_NUM_FORMS': '1000',
+            'page': '2',
+        }
+        response = self.client.post(reverse('orders:order-add'), data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['items_page'].number, 2)
+        self.assertContains(response, '<input type="hidden" name="page" value="2">')
+
+    def _order_with_lines(self):
+        order = self._create_order()
+        order.usd_rmb = Decimal('0.14')
+        order.save()
+        for item in self.items:
+            order_models.OrderItem.objects.create(
+                order=order, item=item, quantity=2, cost_price=item.cost_price, margin=Decimal('10')
+            )
+        return order
+
+    def test_reprice_order_after_exchange_rate_change(self):
+        order = self._order_with_lines()
+        order_models.Order.objects.filter(pk=order.pk).update(usd_rmb=Decimal('0.15'))
+
+        # leitura + um UPDATE em lote
+        with self.assertNumQueries(2):
+            summary = pricing.reprice_order(order)
+
+        self.assertEqual(summary['lines'], 4)
+        self.assertEqual(summary['changed'], 3)  # a linha em USD não muda
+        self.assertEqual(summary['delta'], Decimal('1.98'))
+        self.assertEqual(
+            list(order.order_items.values_list('sale_price', flat=True)),
+            [Decimal('1.10'), Decimal('3.30'), Decimal('4.95'), Decimal('6.60')],
+        )
+        self.assertEqual(pricing.reprice_order(order)['changed'], 0)
+
+    def test_reprice_orders_command_skips_locked_orders(self):
+        open_order = self._order_with_lines()
+        locked = self._order_with_lines()
+        locked.is_locked = True
+        locked.save()
+
+        call_command('reprice_orders', '--usd-rmb', '0.15', stdout=io.StringIO())
+
+        open_order.refresh_from_db()
+        locked.refresh_from_db()
+        self.assertEqual(open_order.usd_rmb, Decimal('0.15'))
+        self.assertEqual(locked.usd_rmb, Decimal('0.14'))
+        self.assertEqual(open_order.order_items.get(item=self.items[1]).sale_price, Decimal('3.30'))
+        self.assertEqual(locked.order_items.get(item=self.items[1]).sale_price, Decimal('3.08'))
+
+    def test_update_margins_view_applies_defaults_in_bulk(self):
+        order = self._order_with_lines()
+        order_models.OrderItem.objects.filter(order=order).exclude(item=self.items[3]).update(margin=None)
+        # custo em dólar gravado com um câmbio antigo
+        order_models.OrderItem.objects.filter(order=order, item=self.items[1]).update(cost_price_usd=Decimal('9.99'))
+
+        # mapa de margens do cliente + leitura das linhas + um UPDATE em lote
+        with self.assertNumQueries(3):
+            self.assertEqual(pricing.apply_default_margins(order), 1)
+
+        lines = {oi.item_id: oi for oi in order.order_items.all()}
+        self.assertEqual(lines[self.items[1].pk].margin, Decimal('50.00'))
+        self.assertEqual(lines[self.items[1].pk].cost_price_usd, Decimal('2.80'))
+        self.assertEqual(lines[self.items[1].pk].sale_price, Decimal('4.20'))
+        self.assertIsNone(lines[self.items[0].pk].margin)  # sem margem padrão
+        self.assertEqual(lines[self.items[3].pk].margin, Decimal('10.00'))
+
+        order_models.OrderItem.objects.filter(pk=lines[self.items[1].pk].pk).update(margin=None)
+        response = self.client.post(reverse('orders:order-update-margins', args=[order.pk]))
+        self.assertRedirects(response, reverse('orders:order-edit', args=[order.pk]), fetch_redirect_response=False)
+        self.assertEqual(order.order_items.get(item=self.items[1]).margin, Decimal('50.00'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderItemFormSetQueriesTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self._create_order()
+        self.url = reverse('orders:order-edit', args=[self.order.pk])
+
+    def _add_lines(self, count):
+        for _ in range(count):
+            order_models.OrderItem.objects.create(order=self.order, item=self.item, quantity=1)
+
+    def test_edit_page_queries_do_not_grow_with_rows(self):
+        self._add_lines(1)
+        with CaptureQueriesContext(connection) as one_row:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self._add_lines(7)
+        cache.clear()
+        with CaptureQueriesContext(connection) as many_rows:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['items_formset'].forms), 8)
+        self.assertEqual(len(one_row), len(many_rows))
+
+    def test_locked_order_disables_packaging_without_extra_queries(self):
+        self._add_lines(3)
+        self.order.is_locked = True
+        self.order.save()
+
+        FormSet = order_item_formset_factory(extra=0)
+        # margens do cliente, linhas, itens e embalagens: uma query cada,
+        # compartilhadas por todas as linhas (e pelo empty_form)
+        with self.assertNumQueries(4):
+            fs = FormSet(instance=self.order, prefix='orderitems', form_kwargs={'customer': self.customer})
+            forms = fs.forms + [fs.empty_form]
+            for form in forms:
+                str(form['item'])
+                str(form['packaging_version'])
+        self.assertTrue(all(f.fields['packaging_version'].disabled for f in fs.forms))
+
+    def test_packaging_choices_are_scoped_to_each_row_item(self):
+        other = inv_models.Item.objects.get(pk=self.item.pk)
+        other.pk, other.p_code, other.name = None, 'P2', 'Other'
+        other.save()
+        other_pkg = inv_models.ItemPackagingVersion.objects.get(pk=self.pkg1.pk)
+        other_pkg.pk, other_pkg.item = None, other
+        other_pkg.save()
+        self._add_lines(1)
+        order_models.OrderItem.objects.create(order=self.order, item=other, quantity=1)
+
+        fs = order_item_formset_factory(extra=0)(instance=self.order, prefix='orderitems')
+        # itens e as versões dos dois itens em uma única query
+        with self.assertNumQueries(2):
+            choices = [
+                [value for value, _ in f.fields['packaging_version'].choices if value]
+                for f in fs.forms
+            ]
+        self.assertEqual(choices, [[self.pkg1.pk], [other_pkg.pk]])
+
+        # uma versão de outro item é recusada na validação
+        form = fs.forms[0]
+        field = form.fields['packaging_version']
+        with self.assertRaises(ValidationError):
+            field.clean(other_pkg.pk)
+
+    def test_changing_item_scopes_packaging_to_posted_item(self):
+        other = inv_models.Item.objects.get(pk=self.item.pk)
+        other.pk, other.p_code, other.name = None, 'P2', 'Other'
+        other.save()
+        other_pkg = inv_models.ItemPackagingVersion.objects.get(pk=self.pkg1.pk)
+        other_pkg.pk, other_pkg.item = None, other
+        other_pkg.save()
+        self._add_lines(1)
+        line = self.order.order_items.get()
+
+        def post(packaging_version):
+            data = {
+                'orderitems-TOTAL_FORMS': '1', 'orderitems-INITIAL_FORMS': '1',
+                'orderitems-MIN_NUM_FORMS': '0', 'orderitems-MAX_NUM_FORMS': '1000',
+                'orderitems-0-id': str(line.pk), 'orderitems-0-order': str(self.order.pk),
+                'orderitems-0-item': str(other.pk),
+                'orderitems-0-packaging_version': str(packaging_version),
+                'orderitems-0-quantity': '1',
+            }
+            return order_item_formset_factory(extra=0)(data, instance=self.order, prefix='orderitems')
+
+        # a linha gravada troca de item: as versões válidas são as do novo item
+        fs = post(other_pkg.pk)
+        self.assertEqual(
+            [value for value, _ in fs.forms[0].fields['packaging_version'].choices if value],
+            [other_pkg.pk],
+        )
+        self.assertTrue(fs.is_valid(), fs.errors)
+        self.assertFalse(post(self.pkg1.pk).is_valid())
+
+    def test_packaging_page_loads_versions_in_one_query(self):
+        url = reverse('orders:order-packaging-edit', args=[self.order.pk])
+        self._add_lines(1)
+        with CaptureQueriesContext(connection) as one_row:
+            self.client.get(url)
+
+        self._add_lines(7)
+        with CaptureQueriesContext(connection) as many_rows:
+            response = self.client.get(url)
+        self.assertContains(response, f'{self.pkg1.valid_from:%Y-%m-%d %H:%M}')
+        self.assertEqual(len(one_row), len(many_rows))
+
+
+class OrderUpdatePaginationTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self._create_order()
+        self.url = reverse('orders:order-edit', args=[self.order.pk])
+        order_models.OrderItem.objects.bulk_create([
+            order_models.OrderItem(order=self.order, item=self.item, quantity=1)
+            for _ in range(25)
+        ])
+        self.pks = list(self.order.order_items.values_list('pk', flat=True))
+
+    def _page(self, cursor=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'cursor': cursor} if cursor else {})
+        page = response.context['items_page']
+        pks = [f.instance.pk for f in response.context['items_formset'].forms]
+        return page, pks, queries
+
+    def test_pages_follow_cursor_without_count_or_offset(self):
+        first, first_pks, first_queries = self._page()
+        second, second_pks, _ = self._page(first.next_cursor)
+        third, third_pks, third_queries = self._page(second.next_cursor)
+
+        self.assertEqual(first_pks + second_pks + third_pks, self.pks)
+        self.assertFalse(third.has_next())
+        self.assertEqual(len(first_queries), len(third_queries))
+        item_sql = [q['sql'] for q in third_queries if 'FROM "orders_orderitem"' in q['sql']]
+        self.assertFalse(any('COUNT(' in sql or 'OFFSET' in sql for sql in item_sql))
+
+        previous, previous_pks, _ = self._page(third.previous_cursor)
+        self.assertEqual(previous_pks, second_pks)
+        back_to_first, pks, _ = self._page(second.previous_cursor)
+        self.assertEqual(pks, first_pks)
+        self.assertIsNone(back_to_first.cursor)
+
+    def test_invalid_post_builds_page_formset_once(self):
+        first, _, _ = self._page()
+        data = {
+            'orderitems-TOTAL_FORMS': '0',
+            'orderitems-INITIAL_FORMS': '0',
+            'cursor': first.next_cursor,
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f"{self.url}?cursor={first.next_cursor}", data)
+        self.assertEqual(response.status_code, 200)
+        # página (pks) e linhas do formset: uma query cada, mesmo com o
+        # form_invalid remontando o contexto
+        page_sql = [q['sql'] for q in queries if 'LIMIT 11' in q['sql']]
+        rows_sql = [q['sql'] for q in queries if '"orders_orderitem"."id" IN' in q['sql']]
+        self.assertEqual((len(page_sql), len(rows_sql)), (1, 1))
+
+
+class OrderListCursorPaginationTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for _ in range(23):
+            self._create_order()
+        # empates em created_at são desfeitos pelo pk
+        now = timezone.now()
+        ids = list(order_models.Order.objects.order_by('pk').values_list('pk', flat=True))
+        order_models.Order.objects.filter(pk__in=ids[:12]).update(created_at=now)
+        order_models.Order.objects.filter(pk__in=ids[12:]).update(created_at=now.replace(microsecond=123456))
+        self.expected = list(
+            order_models.Order.objects.order_by('-created_at', '-pk').values_list('pk', flat=True)
+        )
+        self.url = reverse('orders:order-list')
+
+    def _get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        return response.context['page_obj'], [o.pk for o in response.context['orders']], queries
+
+    def test_walks_all_orders_by_cursor(self):
+        seen, pages, cursor = [], [], None
+        while True:
+            page, pks, queries = self._get(**({'cursor': cursor} if cursor else {}))
+            seen += pks
+            pages.append(page)
+            self.assertFalse(any('OFFSET' in q['sql'] for q in queries))
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(pages[0].estimated_count, 23)
+
+        _, pks, _ = self._get(cursor=pages[2].previous_cursor)
+        self.assertEqual(pks, self.expected[10:20])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        page, pks, _ = self._get(cursor='not-a-cursor')
+        self.assertIsNone(page.cursor)
+        self.assertEqual(pks, self.expected[:10])
+
+    def test_pagination_links_keep_filters(self):
+        response = self.client.get(self.url, {'search': 'cust'})
+        cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'?search=cust&cursor={cursor}')
+
+
+class DashboardTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self._create_order()
+        self.line = order_models.OrderItem.objects.create(
+            order=self.order, item=self.item, quantity=30, cost_price=Decimal('2.50'), margin=Decimal('100')
+        )
+        for code, status, qty in [('B1', 'production', 4), ('B2', 'transit', 6)]:
+            batch = order_models.OrderBatch.objects.create(order=self.order, batch_code=code, status=status)
+            order_models.BatchItem.objects.create(batch=batch, order_item=self.line, quantity=qty)
+        self.transit_cbm = order_models.BatchLogisticsSummary.objects.get(batch__status='transit').cbm
+
+    def test_refresh_rolls_up_by_status(self):
+        out = io.StringIO()
+        call_command('refresh_dashboard', stdout=out)
+        self.assertIn('3 linha(s)', out.getvalue())
+
+        rows = {
+            r.status: (r.value, r.quantity)
+            for r in order_models.DashboardAggregate.objects.filter(customer=self.customer)
+        }
+        # sale_price 5.00: 20 un. sem lote, 4 em produção, 6 em trânsito
+        self.assertEqual(rows, {
+            'open': (Decimal('100.00'), 20),
+            'production': (Decimal('20.00'), 4),
+            'transit': (Decimal('30.00'), 6),
+        })
+
+        # refresh de novo substitui as linhas
+        self.line.quantity = 10
+        self.line.save()
+        call_command('refresh_dashboard', stdout=io.StringIO())
+        self.assertFalse(order_models.DashboardAggregate.objects.filter(status='open').exists())
+
+    def test_orders_in_closed_batches_are_not_open(self):
+        order = self._create_order()
+        line = order_models.OrderItem.objects.create(
+            order=order, item=self.item, quantity=10, cost_price=Decimal('2.50'), margin=Decimal('100')
+        )
+        for code, status, qty in [('C1', 'delivered', 7), ('C2', 'canceled', 3)]:
+            batch = order_models.OrderBatch.objects.create(order=order, batch_code=code, status=status)
+            order_models.BatchItem.objects.create(batch=batch, order_item=line, quantity=qty)
+
+        call_command('refresh_dashboard', stdout=io.StringIO())
+        response = self.client.get(reverse('orders:dashboard'))
+        # só as 20 un. sem lote da order do setUp continuam em aberto
+        open_row = order_models.DashboardAggregate.objects.get(status='open')
+        self.assertEqual((open_row.value, open_row.quantity), (Decimal('100.00'), 20))
+        self.assertEqual(response.context['open_value'], Decimal('150.00'))
+
+    def test_page_reads_only_aggregates(self):
+        call_command('refresh_dashboard', stdout=io.StringIO())
+        # só entra no próximo refresh
+        order_models.OrderItem.objects.create(order=self.order, item=self.item, quantity=100)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('orders:dashboard'))
+        self.assertEqual(response.context['open_value'], Decimal('150.00'))
+        self.assertEqual(response.context['units_in_production'], 4)
+        self.assertEqual(response.context['cbm_in_transit'], self.transit_cbm)
+        self.assertEqual([r['label'] for r in response.context['by_customer']], ['Cust'])
+        self.assertContains(response, 'In Production')
+
+
+class HotQueryIndexTest(TestCase):
+    """
+    Índices compostos das consultas mais frequentes por FK + ordenação.
+    Os planos só são verificados no PostgreSQL (produção); com as tabelas
+    vazias do teste, seq scan é desligado para o planner mostrar qual
+    índice atende cada consulta.
+    """
+
+    def _hot_queries(self):
+        from apps.shipments import models as shipment_models
+        return [
+            (order_models.OrderItem.objects.filter(order_id=1).order_by('pk'),
+             ['orders_orderitem_order_pk_idx']),
+            (inv_models.ItemPackagingVersion.objects.filter(item_id=1).order_by('-valid_from'),
+             ['inventory_pkgver_item_from_idx']),
+            (inv_models.ItemPackagingVersion.objects
+                .filter(item_id=1, valid_to__isnull=True).order_by('-valid_from'),
+             ['inventory_pkgver_item_from_idx', 'inventory_unique_open_packaging_version']),
+            (order_models.BatchItem.objects.filter(order_item_id=1).exclude(batch_id=2),
+             ['orders_batchitem_oi_batch_idx']),
+            (order_models.OrderBatch.objects.filter(order_id=1).order_by('-created_at', '-pk'),
+             ['orders_batch_order_created_idx']),
+            (shipment_models.ShipmentStage.objects.filter(shipment_id=1, stage_id=1),
+             ['shipment_id_stage_id']),
+        ]
+
+    def test_composite_indexes_replace_single_column_fk_indexes(self):
+        expected = {
+            'orders_orderitem': ('orders_orderitem_order_pk_idx', ['order_id', 'id'], 'order_id'),
+            'orders_batchitem': ('orders_batchitem_oi_batch_idx', ['order_item_id', 'batch_id'], 'order_item_id'),
+            'orders_orderbatch': ('orders_batch_order_created_idx', ['order_id', 'created_at', 'id'], 'order_id'),
+            'inventory_itempackagingversion': ('inventory_pkgver_item_from_idx', ['item_id', 'valid_from'], 'item_id'),
+        }
+        with connection.cursor() as cursor:
+            for table, (name, columns, fk_column) in expected.items():
+                constraints = connection.introspection.get_constraints(cursor, table)
+                self.assertEqual(constraints[name]['columns'], columns)
+                single = [c for c in constraints.values() if c['index'] and not c['unique'] and c['columns'] == [fk_column]]
+                self.assertEqual(single, [], table)
+
+    def test_hot_queries_use_index_scans(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('planos verificados apenas no PostgreSQL')
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for queryset, indexes in self._hot_queries():
+            plan = queryset.explain()
+            self.assertNotIn('Seq Scan', plan, plan)
+            self.assertTrue(any(name in plan for name in indexes), plan)
@@ -5,13 +5,16 @@ app_name = 'orders'
 urlpatterns = [
     # ORDERS
     path('', views.OrderListView.as_view(), name='order-list'),
+    path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
     path('add/', views.OrderCreateView.as_view(), name='order-add'),
     path('<int:pk>/edit/', views.OrderUpdateView.as_view(), name='order-edit'),
     path('<int:pk>/items/import/', views.OrderItemsImportView.as_view(), name='order-item-import'),
+    path('<int:pk>/items/import/<int:job_pk>/status/', views.OrderItemImportJobStatusView.as_view(), name='order-item-import-status'),
     path('items/import/new/', views.NewOrderItemsImportView.as_view(), name='order-item-import-new'),
     path('<int:pk>/update-margins/', views.UpdateOrderMarginsView.as_view(), name='order-update-margins'),
     path('<int:order_pk>/packaging/', views.OrderItemPackagingListView.as_view(), name='order-item-packaging'),
     path('<int:order_pk>/packaging/edit/', views.OrderItemPackagingUpdateView.as_view(), name='order-packaging-edit'),
+    path('<int:order_pk>/items/autocomplete/', views.OrderItemAutocompleteView.as_view(), name='order-item-autocomplete'),
     
     # BATCHES
     path('batches/', views.AllBatchListView.as_view(), name='batch-list'),
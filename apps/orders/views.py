@@ -1,6 +1,5 @@
-import pandas as pd
 from decimal import Decimal
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, JsonResponse
 from django.utils.dateparse import parse_date
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy, reverse
@@ -8,23 +7,40 @@ from django.core.paginator import Paginator
 from django.contrib import messages
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import never_cache
-from django.views.generic import ListView, CreateView, UpdateView, View, DeleteView
-from django.forms import HiddenInput, inlineformset_factory, modelformset_factory
-from django.db.models import Sum, F, DecimalField, Q
+from django.views.generic import ListView, CreateView, UpdateView, View, DeleteView, TemplateView
+from django.forms import HiddenInput, modelformset_factory
+from django.db.models import Q
 from django.db import transaction
-from apps.inventory.models import Item, ItemPackagingVersion
-from apps.pricing.models import CustomerItemMargin
+from apps.inventory.models import ItemPackagingVersion
+from apps.pricing.margins import margin_map
 from apps.core.models import Company
-from .models import Order, OrderBatch, OrderItem, BatchStage, BatchItem, Stage
-from .forms import OrderItemForm, BatchItemFormSet, BatchItemForm, OrderForm, OrderBatchForm, OrderItemsImportForm, BatchStageFormSet, OrderItemPackagingForm
-from agk_core import metrics
+from .models import Order, OrderBatch, OrderItem, OrderItemImportJob, BatchStage, BatchItem, Stage
+from .forms import batch_order_item_queryset, order_item_formset_factory, BatchItemFormSet, BatchItemForm, OrderForm, OrderBatchForm, OrderItemsImportForm, BatchStageFormSet, OrderItemPackagingForm, BaseOrderItemPackagingFormSet
+from agk_core import metrics, pagination, search
+from . import dashboard, importers, logistics, pricing
+
+# —— DASHBOARD ——
+class DashboardView(TemplateView):
+    """
+    Visão geral de orders, lotes e shipments, lida dos agregados
+    pré-calculados (DashboardAggregate); os números são os da última
+    execução de manage.py refresh_dashboard.
+    """
+    template_name = 'orders/dashboard.html'
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx.update(dashboard.summary())
+        return ctx
+
 
 # —— ORDERS ——
-class OrderListView(ListView):  
+class OrderListView(pagination.CursorPaginationMixin, ListView):
     model = Order
     template_name = 'orders/order_list.html'
     context_object_name = 'orders'
     paginate_by = 10
+    estimate_count = True
 
     def get_queryset(self):
         queryset = super().get_queryset().select_related('customer')
@@ -33,9 +49,9 @@ class OrderListView(ListView):
         status_id = self.request.GET.get('status')
         start_date = self.request.GET.get('start_date')
         end_date = self.request.GET.get('end_date')
-        search = self.request.GET.get('search')
+        term = self.request.GET.get('search')
         if customer:
-            queryset = queryset.filter(customer__name__icontains=customer)
+            queryset = queryset.filter(search.contains('customer__name', customer))
         
         if company_id:
             queryset = queryset.filter(company_id=company_id)
@@ -53,12 +69,12 @@ class OrderListView(ListView):
             if parsed_end:
                 queryset = queryset.filter(created_at__date__lte=parsed_end)
 
-        if search:
-            search = search.strip()
+        if term:
+            term = term.strip()
     
-            filters = Q(customer__name__icontains=search)
-            if search.isdigit():
-                filters |= Q(id=int(search))
+            filters = search.contains('customer__name', term)
+            if term.isdigit():
+                filters |= Q(id=int(term))
             queryset = queryset.filter(filters)
            
         return queryset
@@ -74,6 +90,8 @@ class OrderListView(ListView):
 class OrderItemsImportView(View):
     """
     Importa linhas de CSV/XLSX criando OrderItem em um Order já salvo.
+    O arquivo é enfileirado (OrderItemImportJob) e processado por um worker;
+    a página acompanha o progresso via OrderItemImportJobStatusView.
     """
     template_name = 'orders/order_items_import.html'
     form_class = OrderItemsImportForm
@@ -84,9 +102,13 @@ class OrderItemsImportView(View):
 
     def get(self, request, *args, **kwargs):
         form = self.form_class()
+        job = None
+        if job_pk := request.GET.get('job'):
+            job = self.order.import_jobs.filter(pk=job_pk).first()
         return render(request, self.template_name, {
             'import_form': form,
             'order': self.order,
+            'job': job,
         })
 
     def post(self, request, *args, **kwargs):
@@ -97,77 +119,30 @@ class OrderItemsImportView(View):
                 'order': self.order,
             })
 
-        # lê o arquivo
-        file = form.cleaned_data['file']
-        try:
-            df = (pd.read_csv(file) if file.name.lower().endswith('.csv')
-                  else pd.read_excel(file))
-        except Exception as e:
-            form.add_error(None, f'Erro ao ler o arquivo: {e}')
-            return render(request, self.template_name, {
-                'import_form': form,
-                'order': self.order,
-            })
-
-        # verifica colunas
-        df.columns = [c.strip().lower() for c in df.columns]
-        expected = {'item', 'quantity'}
-        if not expected.issubset(df.columns):
-            form.add_error(None, f'Colunas inválidas, precisa ter: {expected}')
-            return render(request, self.template_name, {
-                'import_form': form,
-                'order': self.order,
-            })
-
-        # valida e cria
-        errors = []
-        created = 0
-        for idx, row in df.iterrows():
-            num = idx + 1
-            name = str(row['item']).strip()
-            try:
-                inv_item = Item.objects.get(name__iexact=name)
-            except Item.DoesNotExist:
-                errors.append(f'Linha {num}: item "{name}" não existe.')
-                continue
-            try:
-                qty = float(row['quantity'])
-                if qty <= 0:
-                    raise ValueError
-            except Exception:
-                errors.append(f'Linha {num}: quantidade inválida.')
-                continue
-
-            # tudo ok, cria o OrderItem
-            oi = OrderItem.objects.create(
-                order = self.order,
-                item = inv_item, 
-                packaging_version = inv_item.current_packaging_version(),
-                quantity = qty,
-                cost_price = inv_item.cost_price,   
-            )
-            try:
-                cim = CustomerItemMargin.objects.get(
-                    customer = self.order.customer,
-                    item = inv_item
-                )
-                oi.margin = cim.margin
-            except CustomerItemMargin.DoesNotExist:
-                oi.margin = Decimal('0.00')
-            created += 1
-
-        if errors:
-            for e in errors:
-                form.add_error(None, e)
-            # exibimos também quantos já foram criados, se quiser
-            form.add_error(None, f'{created} itens importados antes dos erros.')
-            return render(request, self.template_name, {
-                'import_form': form,
-                'order': self.order,
-            })
-
-        # sucesso: voltar para edição da ordem
-        return redirect('orders:order-edit', self.order.pk)
+        # salva o arquivo e deixa o processamento para o worker
+        job = OrderItemImportJob.objects.create(
+            order=self.order,
+            file=form.cleaned_data['file'],
+        )
+        url = reverse('orders:order-item-import', args=[self.order.pk])
+        return redirect(f"{url}?job={job.pk}")
+
+
+class OrderItemImportJobStatusView(View):
+    """Progresso de uma importação, em JSON, para o polling da página."""
+
+    def get(self, request, pk, job_pk):
+        job = get_object_or_404(OrderItemImportJob, pk=job_pk, order_id=pk)
+        return JsonResponse({
+            'status': job.status,
+            'status_display': job.get_status_display(),
+            'finished': job.is_finished,
+            'total_rows': job.total_rows,
+            'processed_rows': job.processed_rows,
+            'created_rows': job.created_rows,
+            'error_count': job.error_count,
+            'errors': job.errors if job.is_finished else [],
+        })
 
 
 class NewOrderItemsImportView(View):
@@ -216,53 +191,12 @@ class NewOrderItemsImportView(View):
 
         file = import_form.cleaned_data['file']
         try:
-            df = (pd.read_csv(file)
-                  if file.name.lower().endswith('.csv')
-                  else pd.read_excel(file))
+            # uma única passada: valida e já resolve os pks dos itens
+            rows, errors = importers.validate_new_order_items(importers.iter_chunks(file))
+        except importers.InvalidColumnsError:
+            rows, errors = [], [f'Colunas inválidas. O arquivo deve conter: {importers.REQUIRED_COLUMNS}']
         except Exception as e:
-            import_form.add_error(None, f'Erro ao ler o arquivo: {e}')
-            return render(request, self.template_name, {
-                'import_form': import_form,
-                'order_data':  request.session.get(self.session_data_key, {}),
-            })
-
-        # valida cabeçalho
-        df.columns = [c.strip().lower() for c in df.columns]
-        expected = {'item','quantity'}
-        if not expected.issubset(df.columns):
-            import_form.add_error(
-                None,
-                f'Colunas inválidas. O arquivo deve conter: {expected}'
-            )
-            return render(request, self.template_name, {
-                'import_form': import_form,
-                'order_data':  request.session.get(self.session_data_key, {}),
-            })
-
-        # valida conteúdo linha a linha
-        errors = []
-        seen = set()
-        for idx, row in df.iterrows():
-            linha = idx + 1
-            name  = str(row['item']).strip()
-            try:
-                item = Item.objects.get(name__iexact=name)
-            except Item.DoesNotExist:
-                errors.append(f'Linha {linha}: produto "{name}" não encontrado.')
-                continue
-
-            key = name.lower()
-            if key in seen:
-                errors.append(f'Linha {linha}: produto "{name}" duplicado.')
-            else:
-                seen.add(key)
-
-            try:
-                qty = float(row['quantity'])
-                if qty <= 0:
-                    errors.append(f'Linha {linha}: quantidade deve ser > 0.')
-            except Exception:
-                errors.append(f'Linha {linha}: quantidade inválida.')
+            rows, errors = [], [f'Erro ao ler o arquivo: {e}']
 
         if errors:
             for err in errors:
@@ -272,13 +206,8 @@ class NewOrderItemsImportView(View):
                 'order_data':  request.session.get(self.session_data_key, {}),
             })
 
-        # monta initial_items e grava na sessão
-        initial_items = [
-            {'item': Item.objects.get(name__iexact=str(row['item']).strip()).pk,
-             'quantity': float(row['quantity'])}
-            for _, row in df.iterrows()
-        ]
-        request.session[self.session_items_key] = initial_items
+        # grava na sessão só os pares [item_pk, quantity]
+        request.session[self.session_items_key] = rows
 
         return redirect('orders:order-add')
 
@@ -301,15 +230,18 @@ class OrderCreateView(CreateView):
             initial.update(order_data)
         return initial
 
+    def get_initial_items(self):
+        """Expande os pares [item_pk, quantity] guardados pela importação."""
+        if not hasattr(self, '_initial_items'):
+            self._initial_items = [
+                {'item': item_pk, 'quantity': qty}
+                for item_pk, qty in self.request.session.get(self.sess_items_key, [])
+            ]
+        return self._initial_items
+
     def get_formset_class(self):
-        initial_items = self.request.session.get(self.sess_items_key, [])
-        return inlineformset_factory(
-            Order,
-            OrderItem,
-            form=OrderItemForm,
-            extra=max(1, len(initial_items)),
-            can_delete=True
-        )
+        initial_items = self.get_initial_items()
+        return order_item_formset_factory(extra=max(1, len(initial_items)))
     
     def _build_formset(self, form):
         if form.is_bound and form.is_valid():
@@ -318,19 +250,23 @@ class OrderCreateView(CreateView):
             customer = form.initial.get('customer')
 
         FormSet = self.get_formset_class()
+        form_kwargs = {
+            'customer': customer,
+            'margins': margin_map(customer, self.request),
+        }
         if self.request.method == 'POST':
             fs = FormSet(
                 self.request.POST,
                 instance=self.object or Order(),
                 prefix=self.FORMSET_PREFIX,
-                form_kwargs={'customer': customer}
+                form_kwargs=form_kwargs
             )
         else:
             fs = FormSet(
                 instance=self.object or Order(),
                 prefix=self.FORMSET_PREFIX,
-                initial=self.request.session.get(self.sess_items_key, []),
-                form_kwargs={'customer': customer}
+                initial=self.get_initial_items(),
+                form_kwargs=form_kwargs
             )
 
         return fs
@@ -364,36 +300,10 @@ class OrderCreateView(CreateView):
             # salva os OrderItem sem commitar para ajustar campos
             saved_items = formset.save(commit=False)
 
-            for oi in saved_items:
-                # 1) garante o relacionamento com o pedido
-                oi.order = self.object
-
-                # 2) preço de custo
-                oi.cost_price = oi.item.cost_price
-
-                # 3) versão de embalagem vigente na criação
-                if oi.packaging_version_id is None:
-                    oi.packaging_version = (
-                        oi.item
-                          .packaging_versions
-                          .filter(valid_to__isnull=True)
-                          .order_by('-valid_from')
-                          .first()
-                    )
-
-                # 4) margem de cliente-item
-                if oi.margin is None:
-                    try:
-                        cim = CustomerItemMargin.objects.get(
-                            customer=self.object.customer,
-                            item=oi.item
-                        )
-                        oi.margin = cim.margin
-                    except CustomerItemMargin.DoesNotExist:
-                        oi.margin = Decimal('0.00')
-
-                # 5) salva o OrderItem definitivo
-                oi.save()
+            # custo, embalagem vigente, margem padrão e preços calculados
+            # em memória (3 queries) e gravação em lote
+            pricing.price_order_items(self.object, saved_items, self.request)
+            OrderItem.objects.bulk_create(saved_items, batch_size=importers.BULK_BATCH_SIZE)
 
             # (se houver deletes no formset)
             formset.save_m2m()
@@ -405,10 +315,8 @@ class OrderCreateView(CreateView):
 
 
     def form_invalid(self, form):
-        return render(self.request, self.template_name, {
-            'form': form,
-            'items_formset': self.get_context_data()['items_formset'],
-        })
+        # contexto completo: a página do formset (items_page) volta junto
+        return render(self.request, self.template_name, self.get_context_data(form=form))
     
     def get_success_url(self):
         if self.request.POST.get('action') == 'save_continue':
@@ -429,21 +337,44 @@ class OrderUpdateView(UpdateView):
         if obj.is_locked and request.method.upper() == 'POST':
             return HttpResponseForbidden("Esta order está travada e não pode ser editada.")
         return super().dispatch(request, *args, **kwargs)
-    
+
+    def get_object(self, queryset=None):
+        # dispatch e get/post pedem a order: busca uma vez por request
+        if not hasattr(self, '_order'):
+            self._order = super().get_object(queryset)
+        return self._order
 
     def get_orderitems_qs(self):
         return OrderItem.objects.filter(order=self.object).order_by('pk')
 
     def get_formset_class(self):
-        return inlineformset_factory(
-            Order,
-            OrderItem,
-            form=OrderItemForm,
-            extra=0,
-            can_delete=True
+        return order_item_formset_factory(extra=0)
+
+    def get_cursor(self):
+        # lê o cursor de GET (ou de POST, caso venha via hidden input)
+        return (
+            self.request.GET.get(pagination.CURSOR_PARAM)
+            or self.request.POST.get(pagination.CURSOR_PARAM)
         )
 
-    def _build_formset(self, form, page_number):
+    def get_items_page(self):
+        """
+        Página de itens por keyset no pk (ver agk_core.pagination): uma
+        query com LIMIT a partir do cursor, sem COUNT nem OFFSET, feita uma
+        vez por request. Só os pks; as linhas completas vêm no formset.
+        """
+        if not hasattr(self, '_items_page'):
+            paginator = pagination.KeysetPaginator(
+                self.get_orderitems_qs().only('pk'), self.PAGINATE_BY,
+            )
+            self._items_page = paginator.get_page(self.get_cursor())
+        return self._items_page
+
+    def get_items_formset(self, form):
+        """Formset da página atual, montado uma vez por request."""
+        if hasattr(self, '_items_formset'):
+            return self._items_formset
+
         # 1) extrai customer e usd_rmb do form pai
         if form.is_bound and form.is_valid():
             customer = form.cleaned_data.get('customer')
@@ -452,14 +383,11 @@ class OrderUpdateView(UpdateView):
             customer = form.initial.get('customer')
             usd_rmb = form.initial.get('usd_rmb') or Decimal('0')
 
-        # 2) determina quais PKs pertencem à fatia atual
-        full_qs = self.get_orderitems_qs()
-        paginator = Paginator(full_qs, self.PAGINATE_BY)
-        page_obj = paginator.get_page(page_number)
-        slice_pks = [oi.pk for oi in page_obj.object_list]
-        page_qs = full_qs.filter(pk__in=slice_pks)
+        # 2) monta o formset apenas com os itens da página, com o saldo
+        # embarcado/restante anotado (coluna "remaining" do template)
+        page_pks = [oi.pk for oi in self.get_items_page()]
+        page_qs = self.get_orderitems_qs().filter(pk__in=page_pks).with_balances()
 
-        # 3) monta o formset apenas com esses itens
         FormSet = self.get_formset_class()
         kwargs = {
             'instance': self.object,
@@ -468,6 +396,7 @@ class OrderUpdateView(UpdateView):
             'form_kwargs': {
                 'customer': customer,
                 'usd_rmb': usd_rmb,
+                'margins': margin_map(customer, self.request),
             }
         }
         if self.request.method == 'POST':
@@ -475,7 +404,7 @@ class OrderUpdateView(UpdateView):
         else:
             fs = FormSet(**kwargs)
 
-        # 4) se a order estiver travada, desabilita campos do formset
+        # 3) se a order estiver travada, desabilita campos do formset
         if self.object.is_locked:
             for subform in fs.forms:
                 for field in subform.fields.values():
@@ -486,61 +415,52 @@ class OrderUpdateView(UpdateView):
                     subform.fields['DELETE'].disabled = True
                     subform.fields['DELETE'].widget.attrs['disabled'] = 'disabled'
 
-        return fs, page_obj
+        self._items_formset = fs
+        return fs
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        form = ctx['form']
-        # 4) lê page de GET (ou de POST, caso venha via hidden input)
-        page_number = int(self.request.GET.get('page', 1) or
-                          self.request.POST.get('page', 1) or
-                          1
-        )
-        fs, page_obj = self._build_formset(form, page_number)
         ctx['order_metrics'] = metrics.get_order_metrics(self.object.pk)
-        ctx['items_formset'] = fs
-        ctx['items_page'] = page_obj
+        ctx['items_formset'] = self.get_items_formset(ctx['form'])
+        ctx['items_page'] = self.get_items_page()
         return ctx
 
     def form_valid(self, form):
-        # 5) salva a Order
+        # 4) salva a Order
         self.object = form.save()
+        # câmbio alterado → reprecifica todas as linhas, não só as da página
+        if 'usd_rmb' in form.changed_data:
+            pricing.reprice_order(self.object)
 
-        # 6) pega o formset da página e salva apenas aqueles itens
-        page_number = int(self.request.POST.get('page', 1))
-        fs, page_obj = self._build_formset(form, page_number)
+        # 5) pega o formset da página e salva apenas aqueles itens
+        fs = self.get_items_formset(form)
 
         if fs.is_valid():
             saved_items = fs.save(commit=False)
-            # itens marcados para exclusão
-            for oi in fs.deleted_objects:
-                oi.delete()
-
-            for oi in saved_items:
-                # aplica sempre o cost_price
-                oi.cost_price = oi.item.cost_price
-                if oi.packaging_version_id is None:
-                    oi.packaging_version = (
-                        oi.item
-                          .packaging_versions
-                          .filter(valid_to__isnull=True)
-                          .order_by('-valid_from')
-                          .first()
-                    )
-                # margem padrão só para itens novos sem margin
-                if oi.pk is None and oi.margin is None:
-                    try:
-                        cim = CustomerItemMargin.objects.get(
-                            customer=self.object.customer,
-                            item=oi.item
+            # embalagem/item trocados mudam os totais dos lotes desses itens;
+            # cada lote é recalculado uma vez, no fim do bloco
+            with logistics.deferred_refresh():
+                # itens marcados para exclusão
+                for oi in fs.deleted_objects:
+                    oi.delete()
+
+                for oi in saved_items:
+                    # aplica sempre o cost_price
+                    oi.cost_price = oi.item.cost_price
+                    if oi.packaging_version_id is None:
+                        oi.packaging_version_id = oi.item.current_packaging_version_id
+                    # margem padrão só para itens novos sem margin
+                    if oi.pk is None and oi.margin is None:
+                        oi.margin = margin_map(self.object.customer_id, self.request).get(
+                            oi.item_id, Decimal('0.00')
                         )
-                        oi.margin = cim.margin
-                    except CustomerItemMargin.DoesNotExist:
-                        oi.margin = Decimal('0.00')
-                oi.save()
+                    oi.save()
 
-            if page_obj.has_next():
-                return redirect(f"{self.request.path}?page={page_number}")
+            page = self.get_items_page()
+            if page.has_next():
+                if page.cursor:
+                    return redirect(f"{self.request.path}?{pagination.CURSOR_PARAM}={page.cursor}")
+                return redirect(self.request.path)
 
             return redirect(self.get_success_url())
 
@@ -570,24 +490,13 @@ class UpdateOrderMarginsView(View):
         return super().dispatch(request, *args, **kwargs)
     
     def post(self, request, pk):
-        order = get_object_or_404(Order, pk=pk)
-        updated = 0
-
-        for oi in order.order_items.all():
-            if oi.margin is None:
-                cim = CustomerItemMargin.objects.filter(
-                    customer=order.customer,
-                    item=oi.item
-                ).first()
-                if cim:
-                    oi.margin = cim.margin
-                    oi.save()
-                    updated += 1
+        # margem padrão + sale_price das linhas sem margem, em lote
+        updated = pricing.apply_default_margins(self.order, request)
 
         messages.success(request,
             f"{updated} item(s) tiveram a margem padrão aplicada."
         )
-        return redirect('orders:order-edit', pk=order.pk)
+        return redirect('orders:order-edit', pk=self.order.pk)
 
 
 class OrderItemPackagingListView(View):
@@ -603,7 +512,7 @@ class OrderItemPackagingListView(View):
 
         # 2) aplica busca (se houver)
         if q:
-            qs = qs.filter(item__name__icontains=q)
+            qs = qs.filter(search.contains('item__name', q))
 
         # 3) paginação
         paginator = Paginator(qs.order_by('pk'), self.paginate_by)
@@ -651,6 +560,7 @@ class OrderItemPackagingUpdateView(View):
         FormSet = modelformset_factory(
             OrderItem,
             form=OrderItemPackagingForm,
+            formset=BaseOrderItemPackagingFormSet,
             extra=0,
             can_delete=False
         )
@@ -671,13 +581,17 @@ class OrderItemPackagingUpdateView(View):
         FormSet = modelformset_factory(
             OrderItem,
             form=OrderItemPackagingForm,
+            formset=BaseOrderItemPackagingFormSet,
             extra=0,
             can_delete=False
         )
         formset = FormSet(request.POST, queryset=page.object_list, prefix=self.prefix)
 
         if formset.is_valid():
-            formset.save()
+            # embalagem trocada muda os totais logísticos dos lotes desses
+            # itens (signal do OrderItem), recalculados uma vez por lote
+            with logistics.deferred_refresh():
+                formset.save()
             # volta pra MESMA página de edição
             return redirect(
                 f"{request.path}?page={page.number}"
@@ -692,31 +606,26 @@ class OrderItemPackagingUpdateView(View):
     
 
 # —— BATCHES ——
-class AllBatchListView(ListView):
+class AllBatchListView(pagination.CursorPaginationMixin, ListView):
     """
     Lista *todos* os lotes de todos os pedidos, mostrando:
      - batch_code
      - created_at
      - order.customer
-     - total_value = soma(quantity * item.price) de cada BatchItem
+     - total_value = soma(quantity * sale_price) de cada BatchItem
     """
     model               = OrderBatch
     template_name       = 'batches/batch_list.html'
     context_object_name = 'batches'
     paginate_by         = 20
+    estimate_count      = True
 
     def get_queryset(self):
         # Anota cada batch com total financeiro
         queryset = (
             OrderBatch.objects
-            .select_related('order__customer')
-            .annotate(
-                total_value=Sum(
-                    F('batch_items__quantity') *
-                    F('batch_items__order_item__item__selling_price'),
-                    output_field=DecimalField(max_digits=14, decimal_places=2)
-                )
-            )
+            .select_related('order__customer', 'order__exporter')
+            .with_total_value()
         )
         customer = self.request.GET.get('customer')
         company_id = self.request.GET.get('company')
@@ -754,7 +663,7 @@ class OrderBatchListView(ListView):
 
     def get_queryset(self):
         order_pk = self.kwargs.get('order_pk')
-        return OrderBatch.objects.filter(order_id=order_pk)
+        return OrderBatch.objects.filter(order_id=order_pk).order_by('-created_at', '-pk')
     
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
@@ -776,17 +685,13 @@ class OrderBatchCreateView(View):
         batch_form.fields['order'].widget = HiddenInput()
 
         # formset de itens do lote, **sem** instância salva
-        # passamos um stub OrderBatch() que NÃO é usado pra filtrar nada
+        # o stub OrderBatch(order=...) só serve pra gerar os extras e
+        # restringir o campo order_item aos itens desse pedido
         items_fs = BatchItemFormSet(
-            instance=OrderBatch(),  # ainda sem pk, mas só pra gerar os extras
+            instance=OrderBatch(order=self.order),
             prefix='items'
         )
 
-        # restringe o campo order_item a apenas itens desse pedido
-        allowed = self.order.order_items.all()
-        for f in items_fs.forms:
-            f.fields['order_item'].queryset = allowed
-
         return render(request, self.template_name, {
             'order':      self.order,
             'form': batch_form,
@@ -801,11 +706,9 @@ class OrderBatchCreateView(View):
         if not batch_form.is_valid():
             # se o lote estourar validação, reexibe *somente* o batch_form
             items_fs = BatchItemFormSet(
-                instance=OrderBatch(),
+                instance=OrderBatch(order=self.order),
                 prefix='items'
             )
-            for f in items_fs.forms:
-                f.fields['order_item'].queryset = self.order.order_items.all()
 
             return render(request, self.template_name, {
                 'order': self.order,
@@ -826,11 +729,6 @@ class OrderBatchCreateView(View):
                 prefix='items'
             )
 
-            # de novo: restringe order_item
-            allowed = self.order.order_items.all()
-            for f in items_fs.forms:
-                f.fields['order_item'].queryset = allowed
-
             # 3) valida o items_fs
             if not items_fs.is_valid():
                 # se houver erro nos itens, reexibe junto com batch_form
@@ -840,8 +738,10 @@ class OrderBatchCreateView(View):
                     'items_fs':   items_fs,
                 })
 
-            # 4) tudo OK → salva os BatchItems
-            items_fs.save()
+            # 4) tudo OK → salva os BatchItems (resumo logístico recalculado
+            # uma vez para o lote, não uma por linha)
+            with logistics.deferred_refresh():
+                items_fs.save()
 
             # 5) cria os BatchStage
             for stage in Stage.objects.all().order_by('name'):
@@ -874,29 +774,29 @@ class OrderBatchDetailView(View):
             prefix='batch_item', 
             initial=[{'order': self.batch.order}]
         )
-        # restringe queryset de order_item
-        allowed = self.order.order_items.all()
-        for f in items_fs.forms:
-            f.fields['order_item'].queryset = allowed
-
 
         return render(request, self.template_name, {
             'batch_form': OrderBatchForm(instance=self.batch),
             'items_fs': items_fs,
             'stages_fs': BatchStageFormSet(instance=self.batch, prefix='batch_stages'),
             'batch': self.batch,
-            'batch_metrics': metrics.get_batch_metrics(self.batch.pk)
+            'batch_metrics': metrics.get_batch_metrics(self.batch.pk),
             }
         )
 
     def post(self, request, *args, **kwargs):
         items_fs = BatchItemFormSet(request.POST, instance=self.batch, prefix='batch_item')
         stages_fs = BatchStageFormSet(request.POST, instance=self.batch, prefix='batch_stages')
-        
-        if items_fs.is_valid() and stages_fs.is_valid(): 
-            items_fs.save()
-            stages_fs.save()
-            
+
+        # a validação trava os OrderItem até o save terminar (ver BaseBatchItemFormSet)
+        with transaction.atomic():
+            saved = items_fs.is_valid() and stages_fs.is_valid()
+            if saved:
+                with logistics.deferred_refresh():
+                    items_fs.save()
+                stages_fs.save()
+
+        if saved:
             return redirect(
                 'orders:batch-detail',
                 order_pk=self.batch.order.pk,
@@ -909,11 +809,35 @@ class OrderBatchDetailView(View):
             'items_fs': items_fs,
             'stages_fs': stages_fs,
             'batch': self.batch,
-            'batch_metrics': metrics.get_batch_metrics(self.batch.pk)
+            'batch_metrics': metrics.get_batch_metrics(self.batch.pk),
             }
         )
 
 
+class OrderItemAutocompleteView(View):
+    """
+    Itens da order com saldo a embarcar, buscados por código ou nome do
+    item (selects de BatchItem), em JSON.
+    """
+
+    def get(self, request, order_pk):
+        order = get_object_or_404(Order, pk=order_pk)
+
+        def search_order_items(term):
+            return (
+                batch_order_item_queryset(order)
+                    .filter(
+                        search.starts_with('item__p_code', term)
+                        | search.starts_with('item__s_code', term)
+                        | search.contains('item__name', term)
+                    )
+                    .filter(remaining__gt=0)
+                    .order_by('pk')
+            )
+
+        return search.autocomplete_response(request, search_order_items)
+
+
 class OrderBatchDeleteView(DeleteView):
     model = OrderBatch
     template_name = 'batches/order_batch_delete.html'
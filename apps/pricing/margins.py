@@ -0,0 +1,71 @@
+"""
+Mapa de margens padrão por cliente ({item_id: margin}).
+
+Cada cliente tem o mapa inteiro carregado em uma única query e guardado no
+cache do Django sob uma chave versionada; salvar ou apagar uma
+CustomerItemMargin incrementa a versão daquele cliente (ver signals.py),
+então as leituras seguintes já vão ao banco. Dentro de um mesmo request o
+mapa também fica memorizado no próprio request.
+"""
+import time
+from django.core.cache import cache
+from .models import CustomerItemMargin
+
+
+CACHE_TIMEOUT = 60 * 60
+REQUEST_ATTR = '_customer_margins'
+
+
+def _version_key(customer_id):
+    return f'pricing:margins:{customer_id}:version'
+
+
+def get_version(customer_id):
+    key = _version_key(customer_id)
+    version = cache.get(key)
+    if version is None:
+        # versão inicial única: um mapa antigo que sobrou no cache nunca é reaproveitado
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(customer_id):
+    """Invalida o mapa do cliente (chamado ao salvar/apagar uma margem)."""
+    try:
+        cache.incr(_version_key(customer_id))
+    except ValueError:
+        cache.set(_version_key(customer_id), time.time_ns(), None)
+
+
+def _load(customer_id):
+    key = f'pricing:margins:{customer_id}:v{get_version(customer_id)}'
+    margins = cache.get(key)
+    if margins is None:
+        margins = dict(
+            CustomerItemMargin.objects
+                .filter(customer_id=customer_id)
+                .values_list('item_id', 'margin')
+        )
+        cache.set(key, margins, CACHE_TIMEOUT)
+    return margins
+
+
+def margin_map(customer, request=None):
+    """
+    Retorna {item_id: margin} das margens padrão do cliente (Customer ou pk).
+    Com `request`, o resultado é reaproveitado no resto do request.
+    """
+    customer_id = getattr(customer, 'pk', customer)
+    if customer_id is None:
+        return {}
+    if request is None:
+        return _load(customer_id)
+
+    memo = getattr(request, REQUEST_ATTR, None)
+    if memo is None:
+        memo = {}
+        setattr(request, REQUEST_ATTR, memo)
+    if customer_id not in memo:
+        memo[customer_id] = _load(customer_id)
+    return memo[customer_id]
@@ -0,0 +1,30 @@
+"""
+Invalida o cache de margens (margins.py) sempre que uma CustomerItemMargin
+é salva ou apagada — pelas views de apps.pricing, pelo admin ou pelo ORM.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import CustomerItemMargin
+from . import margins
+
+
+@receiver(pre_save, sender=CustomerItemMargin)
+def remember_previous_customer(sender, instance, **kwargs):
+    # se a margem trocar de cliente, o mapa do cliente antigo também muda
+    instance._previous_customer_id = None
+    if instance.pk:
+        instance._previous_customer_id = (
+            CustomerItemMargin.objects
+                .filter(pk=instance.pk)
+                .values_list('customer_id', flat=True)
+                .first()
+        )
+
+
+@receiver(post_save, sender=CustomerItemMargin)
+@receiver(post_delete, sender=CustomerItemMargin)
+def invalidate_customer_margins(sender, instance, **kwargs):
+    margins.bump_version(instance.customer_id)
+    previous = getattr(instance, '_previous_customer_id', None)
+    if previous and previous != instance.customer_id:
+        margins.bump_version(previous)
@@ -1,3 +1,51 @@
-from django.test import TestCase
+from decimal import Decimal
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from apps.inventory import models as inv_models
+from apps.core import models as core_models
+from apps.orders.tests import LOCMEM_CACHES, OrderFixtureMixin
+from . import margins
+from .models import CustomerItemMargin
 
-# Create your tests here.
+
+@override_settings(ALLOWED_HOSTS=['testserver'], CACHES=LOCMEM_CACHES)
+class MarginMapCacheTest(OrderFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.item2 = inv_models.Item.objects.get(pk=self.item.pk)
+        self.item2.pk, self.item2.p_code, self.item2.name = None, 'P2', 'Item 2'
+        self.item2.save()
+        self.margin = CustomerItemMargin.objects.create(
+            customer=self.customer, item=self.item, margin=Decimal('20')
+        )
+
+    def test_map_is_cached_and_memoized_per_request(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(margins.margin_map(self.customer), {self.item.pk: Decimal('20.00')})
+        with self.assertNumQueries(0):
+            margins.margin_map(self.customer.pk)
+
+        request = RequestFactory().get('/')
+        first = margins.margin_map(self.customer, request)
+        self.assertIs(margins.margin_map(self.customer.pk, request), first)
+
+    def test_saving_or_deleting_margins_bumps_the_customer_version(self):
+        margins.margin_map(self.customer)
+        CustomerItemMargin.objects.create(customer=self.customer, item=self.item2, margin=Decimal('5'))
+        self.assertEqual(margins.margin_map(self.customer)[self.item2.pk], Decimal('5.00'))
+
+        response = self.client.post(reverse('pricing:margin-delete', args=[self.margin.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(self.item.pk, margins.margin_map(self.customer))
+
+    def test_moving_a_margin_to_another_customer_invalidates_both(self):
+        other = core_models.Customer.objects.create(name='Other', email='o@o.com')
+        margins.margin_map(self.customer)
+        margins.margin_map(other)
+
+        self.client.post(reverse('pricing:margin-edit', args=[self.margin.pk]), {
+            'customer': other.pk, 'item': self.item.pk, 'margin': '30',
+        })
+
+        self.assertEqual(margins.margin_map(self.customer), {})
+        self.assertEqual(margins.margin_map(other), {self.item.pk: Decimal('30.00')})
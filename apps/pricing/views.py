@@ -1,11 +1,18 @@
 from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
+from agk_core.pagination import CursorPaginationMixin
 from .models import CustomerItemMargin
 
-class MarginListView(ListView):
+class MarginListView(CursorPaginationMixin, ListView):
     model = CustomerItemMargin
     template_name = 'pricing/margin_list.html'
     paginate_by = 50
+    # sem created_at: segue o índice único (customer, item)
+    cursor_keys = ('customer_id', 'item_id')
+    estimate_count = True
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('customer', 'item')
 
 class MarginCreateView(CreateView):
     model = CustomerItemMargin
@@ -4,6 +4,8 @@ from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Row, Column, Submit, Field
 from django import forms
 from django.forms.models import inlineformset_factory, BaseInlineFormSet
+from django.urls import reverse_lazy
+from apps.core.widgets import AutocompleteSelect
 
 from .models import Shipment, ShipmentBatch, ShipmentStage, Stage
 
@@ -53,7 +55,10 @@ class ShipmentBatchForm(forms.ModelForm):
         model = ShipmentBatch
         fields = ['order_batch']  # ou os campos necessários
         widgets = {
-            'order_batch': forms.Select(attrs={'class': 'form-control form-control-sm'}),
+            'order_batch': AutocompleteSelect(
+                url=reverse_lazy('shipments:order-batch-autocomplete'),
+                attrs={'class': 'form-control form-control-sm'},
+            ),
         }
 
     def clean_order_batch(self):
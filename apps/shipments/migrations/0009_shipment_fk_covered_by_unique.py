@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-17 16:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0008_shipment_ata_destination_shipment_bl_date_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shipmentbatch',
+            name='shipment',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shipment_batches', to='shipments.shipment'),
+        ),
+        migrations.AlterField(
+            model_name='shipmentstage',
+            name='shipment',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stages', to='shipments.shipment'),
+        ),
+    ]
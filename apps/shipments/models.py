@@ -89,10 +89,12 @@ class Shipment(models.Model):
 
 
 class ShipmentBatch(models.Model):
+    # coberto pelo índice de unique_together (shipment, order_batch)
     shipment = models.ForeignKey(
         Shipment, 
         on_delete=models.CASCADE, 
-        related_name='shipment_batches'
+        related_name='shipment_batches',
+        db_index=False,
     )
     order_batch = models.ForeignKey(OrderBatch, on_delete=models.PROTECT, related_name='in_shipments')
 
@@ -139,7 +141,8 @@ class Stage(models.Model):
 
 
 class ShipmentStage(models.Model):
-    shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name='stages')
+    # coberto pelo índice de unique_together (shipment, stage)
+    shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name='stages', db_index=False)
     stage = models.ForeignKey(Stage, on_delete=models.PROTECT, related_name='+')
     # datas previstas e reais
     estimated_completion = models.DateField("Estimated", null=True, blank=True)
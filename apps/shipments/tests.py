@@ -1,3 +1,61 @@
+from decimal import Decimal
 from django.test import TestCase
+from django.utils import timezone
+from agk_core import metrics
+from apps.inventory import models as inv_models
+from apps.orders import models as order_models
+from apps.orders.tests import OrderFixtureMixin
+from . import models as shipment_models
 
-# Create your tests here.
+
+class ShipmentMetricsTest(OrderFixtureMixin, TestCase):
+    def _packaging(self, item, qpm, weight, valid_to=None):
+        return inv_models.ItemPackagingVersion.objects.create(
+            item=item,
+            net_weight=weight,
+            package_gross_weight=weight + 1,
+            packing_lengh=Decimal('1'),
+            packing_width=Decimal('1'),
+            packing_height=Decimal('0.5'),
+            individual_packing_size=Decimal('1'),
+            individual_packing_type='Box',
+            qty_per_master_box=qpm,
+            valid_from=timezone.now(),
+            valid_to=valid_to,
+        )
+
+    def _batch(self, shipment, order, *lines):
+        batch = order_models.OrderBatch.objects.create(order=order, batch_code=f'B{order.batches.count()}')
+        for order_item, qty in lines:
+            order_models.BatchItem.objects.create(batch=batch, order_item=order_item, quantity=qty)
+        shipment_models.ShipmentBatch.objects.create(shipment=shipment, order_batch=batch)
+        return batch
+
+    def test_shipment_metrics_sum_batch_summaries_with_current_packaging_fallback(self):
+        item2 = inv_models.Item.objects.get(pk=self.item.pk)
+        item2.pk, item2.p_code, item2.name = None, 'P2', 'Item 2'
+        item2.save()
+        order = self._create_order()
+        frozen = order_models.OrderItem.objects.create(order=order, item=self.item, quantity=20)
+        self._packaging(item2, 100, Decimal('9'))          # versão antiga, fechada pela próxima
+        self._packaging(item2, 5, Decimal('2'))
+        loose = order_models.OrderItem.objects.create(order=order, item=item2, quantity=10)
+        order_models.OrderItem.objects.filter(pk=loose.pk).update(packaging_version=None)
+
+        shipment = shipment_models.Shipment.objects.create()
+        for _ in range(15):
+            self._batch(shipment, order, (frozen, 2))
+            self._batch(shipment, order, (loose, 1))
+        self._batch(shipment_models.Shipment.objects.create(), order, (frozen, 10))
+
+        # shipment + checagem de resumos faltando + soma dos resumos
+        with self.assertNumQueries(3):
+            data = metrics.get_shipment_metrics(shipment.pk)
+
+        # 30 un / 10 por caixa (pkg1) + 15 un / 5 por caixa (versão vigente)
+        self.assertEqual(data, {
+            'total_box_qty': '6.00',
+            'total_nw': '9.00',
+            'total_gw': '12.30',
+            'total_cbm': '18,001.50',
+        })
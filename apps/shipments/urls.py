@@ -13,4 +13,6 @@ urlpatterns = [
     # embarque final
     path('final/', views.ShipmentListView.as_view(), name='shipment-list'),
     path('final/<int:pk>/', views.ShipmentUpdateView.as_view(), name='shipment-stages'),
+    # autocomplete (JSON)
+    path('batches/autocomplete/', views.OrderBatchAutocompleteView.as_view(), name='order-batch-autocomplete'),
 ]
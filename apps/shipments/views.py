@@ -7,7 +7,8 @@ from django.contrib import messages
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils.safestring import mark_safe
-from agk_core import metrics
+from agk_core import metrics, search
+from apps.orders.models import OrderBatch
 from .models import Shipment, Stage, ShipmentStage
 from .forms  import ShipmentForm, ShipmentBatchFormSet, ShipmentStageFormSet, ShipmentStageForm, FinalShipmentForm
 
@@ -399,3 +400,18 @@ class ShipmentUpdateView(View):
             #'cancel_url': reverse('shipments:shipment-detail', args=[shipment.pk]),
         }
         return render(request, self.template_name, ctx)
+
+
+class OrderBatchAutocompleteView(View):
+    """Lotes ainda sem shipment, buscados pelo batch_code, em JSON."""
+
+    def get(self, request):
+        def search_batches(term):
+            return (
+                OrderBatch.objects
+                    .filter(search.starts_with('batch_code', term))
+                    .filter(in_shipments__isnull=True)
+                    .order_by('-pk')
+            )
+
+        return search.autocomplete_response(request, search_batches)
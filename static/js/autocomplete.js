@@ -0,0 +1,58 @@
+// Autocomplete para <select data-autocomplete-url> (apps/core/widgets.py).
+// Cada select ganha um campo de busca logo acima; ao digitar, as opções são
+// buscadas no endpoint JSON ({results: [{id, text}]}) e substituem as
+// atuais, mantendo a selecionada. Tudo por delegação de eventos, para valer
+// também nas linhas adicionadas dinamicamente aos formsets.
+document.addEventListener('DOMContentLoaded', () => {
+  const MIN_LENGTH = 2;
+  const DELAY_MS   = 250;
+  const timers     = new WeakMap();
+
+  function ensureSearchInput(select) {
+    const previous = select.previousElementSibling;
+    if (previous && previous.classList.contains('autocomplete-search')) return previous;
+    const input = document.createElement('input');
+    input.type = 'search';
+    input.className = 'form-control form-control-sm mb-1 autocomplete-search';
+    input.placeholder = 'Buscar…';
+    input.autocomplete = 'off';
+    select.before(input);
+    return input;
+  }
+
+  async function load(select, term) {
+    if (term.length < MIN_LENGTH) return;
+    const url = new URL(select.dataset.autocompleteUrl, window.location.origin);
+    url.searchParams.set('q', term);
+    const response = await fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } });
+    if (!response.ok) return;
+    const { results } = await response.json();
+
+    const current = select.value;
+    Array.from(select.options).forEach(opt => {
+      if (opt.value && opt.value !== current) opt.remove();
+    });
+    results.forEach(r => {
+      if (String(r.id) !== current) select.add(new Option(r.text, r.id));
+    });
+  }
+
+  document.querySelectorAll('select[data-autocomplete-url]').forEach(ensureSearchInput);
+
+  document.addEventListener('focusin', e => {
+    if (e.target.matches('select[data-autocomplete-url]')) ensureSearchInput(e.target);
+  });
+
+  document.addEventListener('input', e => {
+    const input = e.target;
+    if (!input.matches('.autocomplete-search')) return;
+    const select = input.nextElementSibling;
+    if (!select || !select.dataset.autocompleteUrl) return;
+    clearTimeout(timers.get(input));
+    timers.set(input, setTimeout(() => load(select, input.value.trim()), DELAY_MS));
+  });
+
+  document.addEventListener('keydown', e => {
+    if (e.key === 'Enter' && e.target.matches('.autocomplete-search')) e.preventDefault();
+  });
+});
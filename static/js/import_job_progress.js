@@ -0,0 +1,55 @@
+document.addEventListener('DOMContentLoaded', () => {
+  const box = document.getElementById('import-job');
+  if (!box) return;
+
+  const statusEl    = document.getElementById('import-job-status');
+  const bar         = document.getElementById('import-job-bar');
+  const processedEl = document.getElementById('import-job-processed');
+  const createdEl   = document.getElementById('import-job-created');
+  const errorsEl    = document.getElementById('import-job-errors');
+  const errorList   = document.getElementById('import-job-error-list');
+  const doneBtn     = document.getElementById('import-job-done');
+  const POLL_MS     = 1500;
+
+  function render(job) {
+    statusEl.textContent    = job.status_display;
+    processedEl.textContent = job.processed_rows;
+    createdEl.textContent   = job.created_rows;
+    errorsEl.textContent    = job.error_count;
+
+    let pct = job.finished ? 100 : 0;
+    if (!job.finished && job.total_rows) {
+      pct = Math.min(99, Math.round(100 * job.processed_rows / job.total_rows));
+    }
+    bar.style.width = `${pct}%`;
+    bar.textContent = `${pct}%`;
+
+    if (job.finished) {
+      bar.classList.remove('progress-bar-animated', 'progress-bar-striped');
+      bar.classList.add(job.status === 'done' ? 'bg-success' : 'bg-danger');
+      if (job.errors.length) {
+        errorList.replaceChildren(...job.errors.map(msg => {
+          const div = document.createElement('div');
+          div.textContent = msg;
+          return div;
+        }));
+        errorList.classList.remove('d-none');
+      }
+      doneBtn.classList.remove('d-none');
+    }
+  }
+
+  async function poll() {
+    try {
+      const resp = await fetch(box.dataset.statusUrl, { headers: { 'Accept': 'application/json' } });
+      const job  = await resp.json();
+      render(job);
+      if (job.finished) return;
+    } catch (err) {
+      console.warn('Falha ao consultar a importação:', err);
+    }
+    setTimeout(poll, POLL_MS);
+  }
+
+  poll();
+});